@@ -11,17 +11,22 @@ Enhanced with:
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta, date
 import numpy as np
-import io
+import hashlib
+import importlib.util
+import os
+import re
 import requests
+from requests.adapters import HTTPAdapter
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import cycle
 from pathlib import Path
-from plotly.subplots import make_subplots
-import warnings
-warnings.filterwarnings('ignore')
 
 # Professional Solar Performance Analysis - PRODUCTION 2025-12-17
 # Complete replacement of existing solar logic with engineering-grade analysis
@@ -47,6 +52,9 @@ except ImportError:
     USER_FRIENDLY_MODE = False
     print("⚠️ User-friendly helpers not available")
 
+# Styler.background_gradient needs matplotlib; checked without importing it
+MATPLOTLIB_AVAILABLE = importlib.util.find_spec('matplotlib') is not None
+
 # ==============================================================================
 # ULTRA-MODERN PAGE CONFIGURATION
 # ==============================================================================
@@ -57,9 +65,16 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-def apply_ultra_modern_styling():
-    """Ultra-modern styling with glassmorphism and advanced animations - ENHANCED VERSION"""
-    st.markdown("""
+def _minify_css(css):
+    """Strip comments and insignificant whitespace; selectors, values and strings keep their meaning"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+# Built and minified once at import; every rerun ships this same string
+ULTRA_MODERN_CSS = _minify_css("""
         <style>
             @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap');
             @import url('https://fonts.googleapis.com/css2?family=JetBrains+Mono:wght@300;400;500;600&display=swap');
@@ -71,6 +86,7 @@ def apply_ultra_modern_styling():
                 --bg-card: rgba(30, 41, 59, 0.7);
                 --bg-glass: rgba(255, 255, 255, 0.03);
                 --bg-glass-strong: rgba(255, 255, 255, 0.08);
+                --bg-frost: rgba(17, 24, 39, 0.92);
                 --text-primary: #ffffff;
                 --text-secondary: #f1f5f9;
                 --text-muted: #94a3b8;
@@ -103,16 +119,36 @@ def apply_ultra_modern_styling():
             
             #MainMenu, footer, header, .stDeployButton { visibility: hidden; }
             
-            /* Ultra-modern glassmorphic cards */
-            .glass-card {
+            /* Shared glass surfaces; components below only add their own sizing and effects */
+            .glass-card,
+            .stTabs [data-baseweb="tab-list"],
+            .metric-card-modern,
+            .section-header-modern {
                 background: var(--bg-glass);
                 backdrop-filter: blur(20px);
                 border: 1px solid var(--border);
+            }
+            
+            .glass-card,
+            .stTabs [data-baseweb="tab-list"],
+            .metric-card-modern {
+                box-shadow: var(--shadow-glass);
+            }
+            
+            /* Small or overlaid surfaces skip backdrop blur; only the marquee surfaces above pay for it */
+            .status-badge,
+            .metric-enhanced {
+                background: var(--bg-glass-strong);
+                border: 1px solid var(--border);
+            }
+            
+            /* Ultra-modern glassmorphic cards */
+            .glass-card {
                 border-radius: 24px;
                 padding: 32px;
                 margin-bottom: 24px;
-                box-shadow: var(--shadow-glass);
-                transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+                transition: transform 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+                will-change: transform;
                 position: relative;
                 overflow: hidden;
             }
@@ -130,7 +166,7 @@ def apply_ultra_modern_styling():
             }
             
             .glass-card:hover {
-                transform: translateY(-8px);
+                transform: translate3d(0, -8px, 0);
                 border-color: var(--border-hover);
                 box-shadow: 0 20px 80px rgba(0, 0, 0, 0.5);
             }
@@ -143,12 +179,8 @@ def apply_ultra_modern_styling():
             .stTabs [data-baseweb="tab-list"] {
                 gap: 4px;
                 margin-bottom: 2rem;
-                background: var(--bg-glass);
-                backdrop-filter: blur(20px);
                 padding: 8px;
                 border-radius: 20px;
-                border: 1px solid var(--border);
-                box-shadow: var(--shadow-glass);
             }
             
             .stTabs [data-baseweb="tab"] {
@@ -195,47 +227,40 @@ def apply_ultra_modern_styling():
             
             /* Enhanced metric cards with data visualization */
             .metric-card-modern {
-                background: var(--bg-glass);
-                backdrop-filter: blur(20px);
-                border: 1px solid var(--border);
                 border-radius: 20px;
                 padding: 28px;
                 margin-bottom: 20px;
-                box-shadow: var(--shadow-glass);
-                transition: all 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+                transition: transform 0.4s cubic-bezier(0.4, 0, 0.2, 1);
+                will-change: transform;
                 position: relative;
                 overflow: hidden;
                 cursor: pointer;
             }
             
+            /* Card-sized sheen that only fades, so hovering never resizes or rotates a layer */
             .metric-card-modern::after {
                 content: '';
                 position: absolute;
-                top: -50%;
-                left: -50%;
-                width: 200%;
-                height: 200%;
+                inset: 0;
                 background: linear-gradient(45deg, transparent, rgba(255,255,255,0.03), transparent);
-                transform: rotate(-45deg) translate(-50%, -50%);
-                transition: transform 0.6s ease;
+                transition: opacity 0.6s ease;
                 opacity: 0;
+                pointer-events: none;
             }
             
             .metric-card-modern:hover {
-                transform: translateY(-6px) scale(1.02);
+                transform: translate3d(0, -6px, 0) scale(1.02);
                 border-color: var(--border-hover);
                 box-shadow: 0 20px 80px rgba(0, 0, 0, 0.4);
             }
             
             .metric-card-modern:hover::after {
                 opacity: 1;
-                transform: rotate(-45deg) translate(-20%, -20%);
             }
             
             /* Advanced button styling */
             .stButton > button {
                 background: var(--bg-glass) !important;
-                backdrop-filter: blur(20px);
                 border: 1px solid var(--border) !important;
                 border-radius: 16px !important;
                 color: var(--text-secondary) !important;
@@ -256,16 +281,12 @@ def apply_ultra_modern_styling():
             .stSelectbox > div > div,
             .stSlider > div > div {
                 background: var(--bg-glass) !important;
-                backdrop-filter: blur(20px);
                 border: 1px solid var(--border) !important;
                 border-radius: 12px !important;
             }
             
             /* Section headers with gradient text */
             .section-header-modern {
-                background: var(--bg-glass);
-                backdrop-filter: blur(20px);
-                border: 1px solid var(--border);
                 border-left: 4px solid var(--accent-blue);
                 border-radius: 16px;
                 padding: 24px;
@@ -286,64 +307,9 @@ def apply_ultra_modern_styling():
             
             /* ========== NEW UI ENHANCEMENTS ========== */
             
-            /* Animated Status Badges */
-            .status-badge {
-                display: inline-flex;
-                align-items: center;
-                gap: 8px;
-                padding: 8px 16px;
-                background: var(--bg-glass-strong);
-                backdrop-filter: blur(20px);
-                border: 1px solid var(--border);
-                border-radius: 12px;
-                font-size: 0.85rem;
-                font-weight: 600;
-                animation: pulse 2s ease-in-out infinite;
-            }
-            
-            @keyframes pulse {
-                0%, 100% { opacity: 1; }
-                50% { opacity: 0.7; }
-            }
-            
-            /* Enhanced Metric Cards with Sparklines */
-            .metric-enhanced {
-                background: var(--bg-glass-strong);
-                backdrop-filter: blur(20px);
-                border: 1px solid var(--border);
-                border-radius: 20px;
-                padding: 24px;
-                transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-                position: relative;
-                overflow: hidden;
-            }
-            
-            .metric-enhanced:hover {
-                transform: translateY(-4px);
-                border-color: var(--accent-blue);
-                box-shadow: var(--shadow-glow);
-            }
-            
-            .metric-enhanced::before {
-                content: '';
-                position: absolute;
-                top: 0;
-                left: 0;
-                width: 4px;
-                height: 100%;
-                background: var(--gradient-blue-green);
-                opacity: 0;
-                transition: opacity 0.3s ease;
-            }
-            
-            .metric-enhanced:hover::before {
-                opacity: 1;
-            }
-            
             /* Quick Action Buttons */
             .quick-action-btn {
                 background: var(--bg-glass-strong) !important;
-                backdrop-filter: blur(20px);
                 border: 1px solid var(--border) !important;
                 border-radius: 14px !important;
                 padding: 14px 24px !important;
@@ -374,15 +340,6 @@ def apply_ultra_modern_styling():
                 padding: 0.5rem 0;
             }
             
-            /* Sidebar Section Headers */
-            .sidebar-section {
-                background: var(--bg-glass);
-                border: 1px solid var(--border);
-                border-radius: 12px;
-                padding: 16px;
-                margin: 12px 0;
-            }
-            
             /* Enhanced Expanders */
             .streamlit-expanderHeader {
                 background: var(--bg-glass-strong) !important;
@@ -412,13 +369,13 @@ def apply_ultra_modern_styling():
                 justify-content: center;
                 box-shadow: 0 8px 32px rgba(102, 126, 234, 0.5);
                 cursor: pointer;
-                transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                transition: transform 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                will-change: transform;
                 z-index: 1000;
             }
             
             .floating-action:hover {
-                transform: scale(1.1) rotate(90deg);
-                box-shadow: 0 12px 48px rgba(102, 126, 234, 0.7);
+                transform: scale(1.1);
             }
             
             /* Improved Loading Animation */
@@ -429,7 +386,6 @@ def apply_ultra_modern_styling():
             /* Enhanced Alert Boxes */
             .stAlert {
                 background: var(--bg-glass-strong) !important;
-                backdrop-filter: blur(20px) !important;
                 border: 1px solid var(--border) !important;
                 border-radius: 16px !important;
                 padding: 16px 20px !important;
@@ -551,8 +507,8 @@ def apply_ultra_modern_styling():
             
             .tooltip .tooltiptext {
                 visibility: hidden;
-                background: var(--bg-glass-strong);
-                backdrop-filter: blur(20px);
+                /* Nearly opaque instead of blurred, so text behind it stays out of the way */
+                background: var(--bg-frost);
                 border: 1px solid var(--border);
                 color: var(--text-primary);
                 text-align: center;
@@ -573,7 +529,108 @@ def apply_ultra_modern_styling():
                 opacity: 1;
             }
         </style>
-    """, unsafe_allow_html=True)
+""")
+
+# Component rules, emitted by the render_* helper that uses them and only on runs that call it
+COMPONENT_CSS = {
+    'status_badge': _minify_css("""
+        <style>
+            /* Animated Status Badges */
+            .status-badge {
+                display: inline-flex;
+                align-items: center;
+                gap: 8px;
+                padding: 8px 16px;
+                border-radius: 12px;
+                font-size: 0.85rem;
+                font-weight: 600;
+            }
+            
+            /* Pulse a few times on mount rather than looping forever */
+            @media (prefers-reduced-motion: no-preference) {
+                .status-badge {
+                    animation: pulse 2s ease-in-out 3;
+                }
+            }
+            
+            @keyframes pulse {
+                0%, 100% { opacity: 1; }
+                50% { opacity: 0.7; }
+            }
+        </style>
+    """),
+    'metric_enhanced': _minify_css("""
+        <style>
+            /* Enhanced Metric Cards with Sparklines */
+            .metric-enhanced {
+                border-radius: 20px;
+                padding: 24px;
+                transition: transform 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+                will-change: transform;
+                position: relative;
+                overflow: hidden;
+            }
+            
+            .metric-enhanced:hover {
+                transform: translate3d(0, -4px, 0);
+                border-color: var(--accent-blue);
+                box-shadow: var(--shadow-glow);
+            }
+            
+            .metric-enhanced::before {
+                content: '';
+                position: absolute;
+                top: 0;
+                left: 0;
+                width: 4px;
+                height: 100%;
+                background: var(--gradient-blue-green);
+                opacity: 0;
+                transition: opacity 0.3s ease;
+            }
+            
+            .metric-enhanced:hover::before {
+                opacity: 1;
+            }
+        </style>
+    """),
+    'sidebar_section': _minify_css("""
+        <style>
+            /* Sidebar Section Headers */
+            .sidebar-section {
+                background: var(--bg-glass);
+                border: 1px solid var(--border);
+                border-radius: 12px;
+                padding: 16px;
+                margin: 12px 0;
+            }
+        </style>
+    """),
+}
+
+def apply_ultra_modern_styling():
+    """Ultra-modern styling with glassmorphism and advanced animations - ENHANCED VERSION"""
+    # Must be emitted on every rerun: Streamlit drops elements a rerun does not re-send, so a
+    # once-per-session guard would strip the styles after the first interaction. A style-only
+    # st.html goes to the event container, skipping the markdown renderer and the layout slot.
+    st.html(ULTRA_MODERN_CSS)
+    # Re-arm the component styles for this run, for the same reason
+    for name in COMPONENT_CSS:
+        st.session_state.pop(f"_css_{name}", None)
+
+def _is_fragment_rerun():
+    """True while only @st.fragment functions are rerunning, not the whole script"""
+    ctx = get_script_run_ctx()
+    return bool(ctx and getattr(ctx, 'fragment_ids_this_run', None))
+
+def use_component_css(name):
+    """Emit a component's styles the first time it is rendered in the current run"""
+    flag = f"_css_{name}"
+    # A fragment rerun clears the fragment's own elements without passing through
+    # apply_ultra_modern_styling, so styles emitted inside it are always re-sent
+    if not st.session_state.get(flag) or _is_fragment_rerun():
+        st.session_state[flag] = True
+        st.html(COMPONENT_CSS[name])
 
 apply_ultra_modern_styling()
 
@@ -581,74 +638,350 @@ apply_ultra_modern_styling()
 # SILENT DATA LOADING (NO CONSOLE MESSAGES)
 # ==============================================================================
 
-@st.cache_data(ttl=3600, show_spinner=False)
-def load_all_energy_data_silent():
-    """Silent, robust data loading that supports CSV/XLSX and avoids hardcoded paths"""
-    ROOT = Path(__file__).resolve().parent
+def _read_xlsx_fast(path):
+    """Stream an xlsx sheet through openpyxl read-only mode, skipping styles and formulas"""
+    try:
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = list(wb.active.iter_rows(values_only=True))
+        finally:
+            wb.close()
+        if not rows:
+            return pd.DataFrame()
+        header = list(rows[0])
+        while header and header[-1] is None:
+            header.pop()
+        body = [row[:len(header)] for row in rows[1:]]
+        while body and all(v is None for v in body[-1]):
+            body.pop()
+        return pd.DataFrame(body, columns=header)
+    except Exception:
+        return pd.read_excel(path)
+
+# Home Assistant history exports: entity_id, state, last_changed.
+# state stays float64: readings such as 59.4 L surface in the fuel tables and CSV exports, where
+# float32 would print as 59.400001525878906, and the saving is under 0.5 MB per 60k-row export.
+HA_EXPORT_SCHEMA = {
+    'dtype': {'entity_id': 'category', 'state': 'float64'},
+    'na_values': ['unavailable', 'unknown'],
+    'parse_dates': ['last_changed'],
+    'sort_by': 'last_changed',
+}
+
+def _apply_schema(df, schema):
+    """Coerce already-loaded columns to the schema's dtypes (no-op when they match)"""
+    if not schema or df.empty:
+        return df
+    for col, dtype in schema.get('dtype', {}).items():
+        if col in df.columns and str(df[col].dtype) != dtype:
+            if dtype == 'category':
+                df[col] = df[col].astype('category')
+            else:
+                df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    for col in schema.get('parse_dates', []):
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='ISO8601')
+    # Sort once here so date-range queries can binary search instead of re-sorting
+    sort_col = schema.get('sort_by')
+    if sort_col in df.columns and not df[sort_col].is_monotonic_increasing:
+        df = df.sort_values(sort_col, kind='stable').reset_index(drop=True)
+    return df
 
-    def load_any(name_candidates):
-        """Try multiple filenames and formats; return DataFrame or empty."""
-        for name in name_candidates:
-            p = ROOT / name
+def power_sensor_mask(entity_ids):
+    """Rows whose entity_id names a power sensor"""
+    if isinstance(entity_ids.dtype, pd.CategoricalDtype):
+        # Match against the handful of categories, then a hash lookup per row
+        categories = entity_ids.cat.categories
+        return entity_ids.isin(categories[categories.str.contains('power', case=False, regex=False)])
+    return entity_ids.str.contains('power', case=False, na=False, regex=False)
+
+def is_new_solar_system(solar_df):
+    """Whether the solar frame comes from the 3-inverter system"""
+    if solar_df.empty or 'system_type' not in solar_df.columns:
+        return False
+    system_type = solar_df['system_type']
+    # A categorical column only needs its categories checked, not every row
+    labels = system_type.cat.categories if isinstance(system_type.dtype, pd.CategoricalDtype) else pd.Index(system_type.dropna().unique())
+    return bool(labels.astype(str).str.contains('3-Inverter', regex=False).any())
+
+def split_by_entity(df):
+    """Per-entity sub-frames of an HA export, keeping the load-time sort order"""
+    if df.empty or 'entity_id' not in df.columns:
+        return {}
+    return {eid: sub.reset_index(drop=True) for eid, sub in df.groupby('entity_id', sort=False, observed=True)}
+
+def _read_csv_typed(path, schema=None):
+    """read_csv with declared dtypes; _apply_schema then parses the date columns and sorts"""
+    if schema:
+        # Arrow's multithreaded parser first; pandas' C parser if pyarrow is missing or rejects the file.
+        # Dates are not passed as parse_dates: Arrow infers ISO-8601 timestamps itself, and for either
+        # engine read_csv's date handling is slower than the single ISO8601 to_datetime in _apply_schema
+        for engine in ('pyarrow', 'c'):
             try:
-                if p.suffix.lower() in {'.xlsx', '.xls'}:
-                    df = pd.read_excel(p)
-                elif p.suffix.lower() in {'.csv'}:
-                    df = pd.read_csv(p)
-                else:
-                    # Try csv then excel without extension
-                    if (ROOT / f"{name}.csv").exists():
-                        df = pd.read_csv(ROOT / f"{name}.csv")
-                    elif (ROOT / f"{name}.xlsx").exists():
-                        df = pd.read_excel(ROOT / f"{name}.xlsx")
-                    else:
-                        continue
-                if df is not None and not df.empty:
-                    return df
-            except Exception:
+                return _apply_schema(pd.read_csv(
+                    path,
+                    engine=engine,
+                    dtype=schema.get('dtype'),
+                    na_values=schema.get('na_values'),
+                ), schema)
+            except (ImportError, ValueError, TypeError):
                 continue
-        return pd.DataFrame()
+    return _apply_schema(pd.read_csv(path), schema)
 
-    data = {}
+# Parquet copies of parsed sources live here rather than beside the data, so reading never writes into it
+CACHE_DIR = Path(os.environ.get('DURRENERGY_CACHE_DIR') or Path.home() / '.cache' / 'durrenergy')
 
-    # Primary generator and fuel history (support both csv/xlsx)
-    data['generator'] = load_any(["gen (2).csv", "gen (2).xlsx", "gen.csv", "gen.xlsx"])    
-    data['fuel_history'] = load_any(["history (5).csv", "history (5).xlsx", "history.csv", "history.xlsx"])  
-    data['factory'] = load_any(["FACTORY ELEC.csv", "FACTORY ELEC.xlsx", "factory.csv", "factory.xlsx"])    
+def _cache_path(source, suffix='.parquet'):
+    """Cache file for a source path or URL, keyed by its full name so same-named sources never collide"""
+    digest = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:12]
+    return CACHE_DIR / f"{Path(str(source)).name}.{digest}{suffix}"
 
-    # Fuel purchase data (real pricing) without hardcoded absolute path
-    data['fuel_purchases'] = load_any(["Durr bottling Generator filling.xlsx", "fuel_purchases.xlsx", "fuel.xlsx"]) 
+def _write_parquet_cache(df, cached):
+    """Best-effort Parquet copy; a read-only or full cache directory only costs the next parse"""
+    try:
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        df.to_parquet(cached, engine='pyarrow', compression='zstd')
+        return True
+    except Exception as e:
+        print(f"⚠️ Could not write cache {cached}: {e}")
+        return False
 
-    # Load new 3-inverter system data with GitHub fallback
-    solar_local = load_any(["New_inverter.csv", "New_inverter.xlsx"]) 
-    if solar_local.empty:
+def _read_source(path_str, mtime, schema=None):
+    """Parse a single CSV/XLSX source, preferring a cached Parquet copy at least as new as the file"""
+    p = Path(path_str)
+
+    # Prefer a Parquet copy that is at least as new as the source file
+    cached = _cache_path(p.resolve())
+    if cached.exists() and cached.stat().st_mtime >= mtime:
         try:
-            github_url = "https://raw.githubusercontent.com/Saint-Akim/Solar-performance/main/New_inverter.csv"
-            response = requests.get(github_url, timeout=10)
-            if response.status_code == 200:
-                solar_local = pd.read_csv(io.StringIO(response.text))
+            df = pd.read_parquet(cached, engine='pyarrow')
+            if not df.empty:
+                return _apply_schema(df, schema)
         except Exception:
-            solar_local = pd.DataFrame()
+            pass
 
-    if not solar_local.empty:
-        solar_local['source_file'] = 'New_inverter.csv'
-        solar_local['system_type'] = '3-Inverter Enhanced System'
-        data['solar'] = solar_local
+    if p.suffix.lower() == '.xlsx':
+        df = _apply_schema(_read_xlsx_fast(p), schema)
+    elif p.suffix.lower() == '.xls':
+        df = _apply_schema(pd.read_excel(p), schema)
     else:
-        # Fallback to legacy files
+        df = _read_csv_typed(p, schema)
+
+    if df is not None and not df.empty:
+        _write_parquet_cache(df, cached)
+    return df
+
+def _read_first(candidates, schema=None):
+    """First non-empty parse among (path, mtime, size) candidates, or an empty frame"""
+    for path_str, mtime, _ in candidates:
+        try:
+            df = _read_source(path_str, mtime, schema)
+            if df is not None and not df.empty:
+                return df
+        except Exception:
+            continue
+    return pd.DataFrame()
+
+def _parse_sources(versions):
+    """Parse {key: (candidates, schema)} in turn; each file is read by Arrow's own multithreaded parser"""
+    return {key: _read_first(candidates, schema) if candidates else pd.DataFrame()
+            for key, (candidates, schema) in versions.items()}
+
+# Shared session so repeat fetches reuse the pooled TLS connection
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+def _fetch_remote_csv(url, cache_path, max_age_hours=24, schema=None):
+    """Stream a CSV fallback straight into the parser, keeping a local Parquet copy"""
+    cache = Path(cache_path)
+    etag_file = cache.with_name(f"{cache.name}.etag")
+    if cache.exists() and (datetime.now().timestamp() - cache.stat().st_mtime) < max_age_hours * 3600:
+        try:
+            return _apply_schema(pd.read_parquet(cache, engine='pyarrow'), schema)
+        except Exception:
+            pass
+
+    # A stale copy is revalidated with its ETag; 304 means the body is never sent
+    headers = {}
+    if cache.exists() and etag_file.exists():
+        headers['If-None-Match'] = etag_file.read_text().strip()
+
+    with _HTTP.get(url, stream=True, timeout=10, headers=headers) as response:
+        if response.status_code == 304:
+            try:
+                df = _apply_schema(pd.read_parquet(cache, engine='pyarrow'), schema)
+                cache.touch()
+                return df
+            except Exception:
+                return pd.DataFrame()
+        if response.status_code != 200:
+            return pd.DataFrame()
+        etag = response.headers.get('ETag')
+        response.raw.decode_content = True
+        df = _apply_schema(pd.read_csv(response.raw, engine='c'), schema)
+
+    if not df.empty and _write_parquet_cache(df, cache) and etag:
+        try:
+            etag_file.write_text(etag)
+        except OSError as e:
+            print(f"⚠️ Could not write cache {etag_file}: {e}")
+    return df
+
+# Directory holding the data files, resolved once at import
+ROOT = Path(__file__).resolve().parent
+
+# Data Manager sources: (local filename, URL) pairs, built once at import
+DATA_BASE_URL = "https://raw.githubusercontent.com/Saint-Akim/Solar-performance/main/"
+DATA_DOWNLOADS = (
+    ("New_inverter.csv", DATA_BASE_URL + "New_inverter.csv"),
+    ("FACTORY ELEC.csv", DATA_BASE_URL + "FACTORY%20ELEC.csv"),
+    ("Solar_Goodwe&Fronius-Jan.csv", DATA_BASE_URL + "Solar_Goodwe%26Fronius-Jan.csv"),
+    ("Solar_goodwe&Fronius_April.csv", DATA_BASE_URL + "Solar_goodwe%26Fronius_April.csv"),
+    ("Solar_goodwe&Fronius_may.csv", DATA_BASE_URL + "Solar_goodwe%26Fronius_may.csv"),
+    ("gen (2).csv", DATA_BASE_URL + "gen%20%282%29.csv"),
+    ("gen (2).xlsx", DATA_BASE_URL + "gen%20%282%29.xlsx"),
+    ("history (5).csv", DATA_BASE_URL + "history%20%285%29.csv"),
+    ("history (5).xlsx", DATA_BASE_URL + "history%20%285%29.xlsx"),
+    ("Durr bottling Generator filling.xlsx", DATA_BASE_URL + "Durr%20bottling%20Generator%20filling.xlsx"),
+    ("September 2025.xlsx", DATA_BASE_URL + "September%202025.xlsx"),
+)
+
+def _download_file(url, dest, chunk_size=65536):
+    """Stream one URL to disk via a temp file; returns the HTTP status code"""
+    part = f"{dest}.part"
+    with requests.get(url, stream=True, timeout=30) as response:
+        if response.status_code != 200:
+            return response.status_code
+        response.raw.decode_content = True
+        try:
+            with open(part, "wb") as f:
+                shutil.copyfileobj(response.raw, f, length=chunk_size)
+        except BaseException:
+            # Never leave a truncated file behind
+            if os.path.exists(part):
+                os.remove(part)
+            raise
+    os.replace(part, dest)
+    return 200
+
+def download_files(downloads, max_workers=8):
+    """Fetch (filename, url) pairs concurrently; maps each filename to its status code or exception"""
+    if not downloads:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(downloads))) as pool:
+        futures = {fname: pool.submit(_download_file, url, fname) for fname, url in downloads}
+    results = {}
+    for fname, future in futures.items():
+        try:
+            results[fname] = future.result()
+        except Exception as e:
+            results[fname] = e
+    return results
+
+def _mark_power_rows(solar):
+    """Flag the power-sensor rows of a solar frame once, at load"""
+    if 'entity_id' in solar.columns:
+        solar['is_power'] = power_sensor_mask(solar['entity_id'])
+    return solar
+
+def _tag_new_solar(solar):
+    """Label a 3-inverter export with its source and system type"""
+    if solar.empty:
+        return solar
+    tag_codes = np.zeros(len(solar), dtype=np.int8)
+    solar['source_file'] = pd.Categorical.from_codes(tag_codes, ['New_inverter.csv'])
+    solar['system_type'] = pd.Categorical.from_codes(tag_codes, ['3-Inverter Enhanced System'])
+    return _mark_power_rows(solar)
+
+# Keyed on every candidate's path, mtime and size, so a changed file adds a new entry (bounded by max_entries)
+@st.cache_data(ttl=None, show_spinner=False, max_entries=4)
+def _load_local_data(versions):
+    """Parse the local sources and derive everything that does not depend on the selected dates"""
+    loaded = _parse_sources(versions)
+    data = {key: loaded[key] for key in ('generator', 'fuel_history', 'factory')}
+
+    # Entity slices are independent of the selected dates, so split once per file version
+    data['generator_by_entity'] = split_by_entity(data['generator'])
+    data['fuel_history_by_entity'] = split_by_entity(data['fuel_history'])
+
+    # Fuel purchases normalized once here so every consumer sees date, litres, cost, price_per_litre
+    data['fuel_purchases'] = normalize_purchase_columns(loaded['fuel_purchases'])
+
+    data['solar'] = _tag_new_solar(loaded['solar'])
+    return data
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _load_remote_solar(url, cache_path):
+    """GitHub copy of the 3-inverter export, tagged like the local file"""
+    return _tag_new_solar(_fetch_remote_csv(url, cache_path, schema=HA_EXPORT_SCHEMA))
+
+@st.cache_data(ttl=None, show_spinner=False, max_entries=4)
+def _load_legacy_solar(versions):
+    """Legacy Goodwe/Fronius exports combined into one tagged frame"""
+    legacy_frames = {f: df for f, df in _parse_sources(versions).items() if not df.empty}
+    if not legacy_frames:
+        return pd.DataFrame()
+    # One concat; both tag columns are built straight from codes, never as per-row strings
+    legacy = pd.concat(legacy_frames.values(), ignore_index=True)
+    file_codes = np.repeat(np.arange(len(legacy_frames), dtype=np.int8), [len(df) for df in legacy_frames.values()])
+    legacy['source_file'] = pd.Categorical.from_codes(file_codes, list(legacy_frames))
+    legacy['system_type'] = pd.Categorical.from_codes(np.zeros(len(legacy), dtype=np.int8), ['Legacy System'])
+    # Re-apply the schema: mixed categories concat to strings and files may overlap in time
+    return _mark_power_rows(_apply_schema(legacy, HA_EXPORT_SCHEMA))
+
+def load_all_energy_data_silent():
+    """Silent, robust data loading that supports CSV/XLSX and avoids hardcoded paths"""
+    # Parsing and load-time derivation are cached on the file versions, and the GitHub fallback
+    # on its TTL; a warm call only lists the directory, stats the files and takes cache hits
+
+    # One directory listing per load, so absent candidates are dict misses rather than failed stats
+    files = {entry.name: entry for entry in os.scandir(ROOT) if entry.is_file()}
+
+    def versions_of(name_candidates):
+        """(path, mtime, size) of each candidate that exists, in preference order"""
+        found = []
+        for name in name_candidates:
+            # Try csv then excel when no extension is given
+            names = [name] if Path(name).suffix.lower() in {'.csv', '.xlsx', '.xls'} else [f"{name}.csv", f"{name}.xlsx"]
+            for fname in names:
+                entry = files.get(fname)
+                if entry is None:
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                found.append((entry.path, stat.st_mtime, stat.st_size))
+        return tuple(found)
+
+    # Primary generator and fuel history (support both csv/xlsx), fuel purchases (real pricing)
+    # and the new 3-inverter system
+    data = _load_local_data({
+        'generator': (versions_of(["gen (2).csv", "gen (2).xlsx", "gen.csv", "gen.xlsx"]), HA_EXPORT_SCHEMA),
+        'fuel_history': (versions_of(["history (5).csv", "history (5).xlsx", "history.csv", "history.xlsx"]), HA_EXPORT_SCHEMA),
+        'factory': (versions_of(["FACTORY ELEC.csv", "FACTORY ELEC.xlsx", "factory.csv", "factory.xlsx"]), HA_EXPORT_SCHEMA),
+        'fuel_purchases': (versions_of(["Durr bottling Generator filling.xlsx", "fuel_purchases.xlsx", "fuel.xlsx"]), None),
+        'solar': (versions_of(["New_inverter.csv", "New_inverter.xlsx"]), HA_EXPORT_SCHEMA),
+    })
+
+    # New 3-inverter system data with GitHub fallback, then the legacy files
+    if data['solar'].empty:
+        try:
+            github_url = "https://raw.githubusercontent.com/Saint-Akim/Solar-performance/main/New_inverter.csv"
+            data['solar'] = _load_remote_solar(github_url, str(_cache_path(github_url)))
+        except Exception:
+            data['solar'] = pd.DataFrame()
+
+    if data['solar'].empty:
         legacy_files = [
             'Solar_Goodwe&Fronius-Jan.csv',
             'Solar_goodwe&Fronius_April.csv', 
             'Solar_goodwe&Fronius_may.csv'
         ]
-        legacy_frames = []
-        for f in legacy_files:
-            df = load_any([f])
-            if not df.empty:
-                df['source_file'] = f
-                df['system_type'] = 'Legacy System'
-                legacy_frames.append(df)
-        data['solar'] = pd.concat(legacy_frames, ignore_index=True) if legacy_frames else pd.DataFrame()
+        data['solar'] = _load_legacy_solar({f: (versions_of([f]), HA_EXPORT_SCHEMA) for f in legacy_files})
+
+    data['solar_is_new_system'] = is_new_solar_system(data['solar'])
 
     return data
 
@@ -659,20 +992,25 @@ def load_all_energy_data_silent():
 def render_clean_metric(label, value, delta=None, color="blue", icon="📊", description=None, trend_data=None):
     """Clean metric using native Streamlit components - supports old function signature"""
     
-    # Use native Streamlit components
-    with st.container():
-        col1, col2 = st.columns([1, 4])
-        
-        with col1:
-            st.markdown(f"<div style='font-size: 2.5rem; text-align: center;'>{icon}</div>", unsafe_allow_html=True)
-        
-        with col2:
-            st.metric(
-                label=label,
-                value=value,
-                delta=delta,
-                help=description
-            )
+    # Use native Streamlit components; the columns block is the card's only wrapper element
+    col1, col2 = st.columns([1, 4])
+    
+    with col1:
+        st.markdown(f"<div style='font-size: 2.5rem; text-align: center;'>{icon}</div>", unsafe_allow_html=True)
+    
+    with col2:
+        st.metric(
+            label=label,
+            value=value,
+            delta=delta,
+            help=description
+        )
+
+def render_clean_metric_row(cards):
+    """One row of clean metrics from a list of render_clean_metric argument tuples"""
+    for col, card in zip(st.columns(len(cards)), cards):
+        with col:
+            render_clean_metric(*card)
 
 # ==============================================================================
 # NEW UI ENHANCEMENT FUNCTIONS
@@ -680,6 +1018,7 @@ def render_clean_metric(label, value, delta=None, color="blue", icon="📊", des
 
 def render_status_badge(text, status="live", icon="🟢"):
     """Render an animated status badge"""
+    use_component_css('status_badge')
     status_colors = {
         "live": "#10b981",
         "warning": "#f59e0b", 
@@ -696,23 +1035,31 @@ def render_status_badge(text, status="live", icon="🟢"):
         </div>
     """, unsafe_allow_html=True)
 
-def render_enhanced_metric(label, value, delta=None, icon="📊", trend_data=None, color="#3b82f6"):
-    """Enhanced metric card with sparkline and better visual hierarchy"""
+# Sparkline glyphs, lowest to highest
+SPARK_CHARS = np.array(['▁', '▂', '▃', '▄', '▅', '▆', '▇', '█'])
+
+# Markup strings are immutable, so they are shared as resources instead of pickled per cache hit
+@st.cache_resource(show_spinner=False, max_entries=256)
+def _build_enhanced_metric_html(label, value, delta, icon, trend_tuple, color):
+    """Build the enhanced metric card markup; trend_tuple must be hashable"""
     delta_html = ""
     if delta:
         delta_color = "#10b981" if isinstance(delta, str) and "+" in str(delta) else "#ef4444"
         delta_html = f'<div style="color: {delta_color}; font-size: 0.9rem; font-weight: 600; margin-top: 8px;">{delta}</div>'
     
     sparkline_html = ""
-    if trend_data and len(trend_data) > 0:
+    if trend_tuple:
         # Create simple sparkline using Unicode characters
-        max_val = max(trend_data) if max(trend_data) > 0 else 1
-        bars = [int((val / max_val) * 8) for val in trend_data]
-        spark_chars = ['▁', '▂', '▃', '▄', '▅', '▆', '▇', '█']
-        sparkline = ''.join([spark_chars[min(b, 7)] for b in bars])
+        values = np.asarray(trend_tuple, dtype=float)
+        max_val = values.max()
+        if max_val <= 0:
+            max_val = 1
+        # Bar heights are picked for the whole series at once by indexing the glyph array
+        bars = np.clip(values * (8.0 / max_val), 0, 7).astype(np.int8)
+        sparkline = ''.join(SPARK_CHARS[bars])
         sparkline_html = f'<div style="color: {color}; font-size: 1.2rem; margin-top: 8px; letter-spacing: 2px;">{sparkline}</div>'
     
-    st.markdown(f"""
+    return f"""
         <div class="metric-enhanced">
             <div style="display: flex; align-items: center; gap: 12px; margin-bottom: 12px;">
                 <span style="font-size: 2rem;">{icon}</span>
@@ -722,7 +1069,13 @@ def render_enhanced_metric(label, value, delta=None, icon="📊", trend_data=Non
             {delta_html}
             {sparkline_html}
         </div>
-    """, unsafe_allow_html=True)
+    """
+
+def render_enhanced_metric(label, value, delta=None, icon="📊", trend_data=None, color="#3b82f6"):
+    """Enhanced metric card with sparkline and better visual hierarchy"""
+    use_component_css('metric_enhanced')
+    trend_tuple = tuple(trend_data) if trend_data is not None and len(trend_data) > 0 else ()
+    st.markdown(_build_enhanced_metric_html(label, value, delta, icon, trend_tuple, color), unsafe_allow_html=True)
 
 def render_quick_action_panel():
     """Render a quick action panel for common tasks"""
@@ -749,9 +1102,10 @@ def render_quick_action_panel():
         if st.button("📖 Help Guide", key="qa_help", use_container_width=True, help="Learn how to use this dashboard"):
             render_glossary()
 
-def render_info_card(title, content, icon="ℹ️", color="#3b82f6"):
-    """Render an informational card"""
-    st.markdown(f"""
+@st.cache_resource(show_spinner=False, max_entries=256)
+def _build_info_card_html(title, content, icon, color):
+    """Build the informational card markup"""
+    return f"""
         <div style="
             background: rgba(59, 130, 246, 0.1);
             border-left: 4px solid {color};
@@ -767,21 +1121,32 @@ def render_info_card(title, content, icon="ℹ️", color="#3b82f6"):
                 {content}
             </div>
         </div>
-    """, unsafe_allow_html=True)
+    """
 
-def render_sidebar_section(title, icon="📌"):
-    """Render a styled sidebar section header"""
-    st.markdown(f"""
+def render_info_card(title, content, icon="ℹ️", color="#3b82f6"):
+    """Render an informational card"""
+    st.markdown(_build_info_card_html(title, content, icon, color), unsafe_allow_html=True)
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def _build_sidebar_section_html(title, icon):
+    """Build the sidebar section header markup"""
+    return f"""
         <div class="sidebar-section">
             <div style="display: flex; align-items: center; gap: 10px;">
                 <span style="font-size: 1.3rem;">{icon}</span>
                 <span style="font-size: 1rem; font-weight: 700; color: #f1f5f9;">{title}</span>
             </div>
         </div>
-    """, unsafe_allow_html=True)
+    """
 
-def render_data_quality_indicator(quality_score):
-    """Render a data quality indicator"""
+def render_sidebar_section(title, icon="📌"):
+    """Render a styled sidebar section header"""
+    use_component_css('sidebar_section')
+    st.markdown(_build_sidebar_section_html(title, icon), unsafe_allow_html=True)
+
+@st.cache_resource(show_spinner=False, max_entries=128)
+def _build_data_quality_html(quality_score):
+    """Build the data quality indicator markup"""
     if quality_score >= 90:
         color = "#10b981"
         status = "Excellent"
@@ -795,7 +1160,7 @@ def render_data_quality_indicator(quality_score):
         status = "Poor"
         icon = "🔴"
     
-    st.markdown(f"""
+    return f"""
         <div style="
             display: flex;
             align-items: center;
@@ -812,7 +1177,11 @@ def render_data_quality_indicator(quality_score):
                 <div style="font-size: 1.1rem; color: {color}; font-weight: 700;">{quality_score}% - {status}</div>
             </div>
         </div>
-    """, unsafe_allow_html=True)
+    """
+
+def render_data_quality_indicator(quality_score):
+    """Render a data quality indicator"""
+    st.markdown(_build_data_quality_html(quality_score), unsafe_allow_html=True)
 
 # ==============================================================================
 # ENHANCED FUEL ANALYSIS WITH REAL PRICING
@@ -824,16 +1193,8 @@ def normalize_purchase_columns(df):
     if df.empty:
         return df
     
-    df = df.copy()
-    
-    # Normalize column names: lowercase, remove spaces/special chars
-    df.columns = (
-        df.columns
-        .str.strip()
-        .str.lower()
-        .str.replace(r'\s+', '_', regex=True)
-        .str.replace(r'[()]+', '', regex=True)
-    )
+    # Shallow copy: only the column index and a few columns are replaced
+    df = df.copy(deep=False)
     
     # Map variations to standard names
     rename_map = {
@@ -841,17 +1202,26 @@ def normalize_purchase_columns(df):
         'amountliters': 'litres',
         'amount': 'litres',
         'liters': 'litres',
+        'quantity': 'litres',
         'costrands': 'cost',
         'cost_rands': 'cost',
         'price_per_liter': 'price_per_litre'
     }
     
-    df = df.rename(columns={c: rename_map.get(c, c) for c in df.columns})
+    # Normalize column names: lowercase, remove spaces/special chars
+    df.columns = (
+        df.columns
+        .str.strip()
+        .str.lower()
+        .str.replace(r'\s+', '_', regex=True)
+        .str.replace(r'[()]+', '', regex=True)
+        .map(lambda c: rename_map.get(c, c))
+    )
     
     # Coerce numeric fields
     for col in ['litres', 'cost', 'price_per_litre']:
         if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+            df[col] = pd.to_numeric(df[col].to_numpy(), errors='coerce')
     
     # Parse date
     if 'date' in df.columns:
@@ -866,15 +1236,11 @@ def process_fuel_purchases_and_pricing(fuel_purchases_df):
         return pd.DataFrame(), 22.50
     
     try:
-        # Normalize columns first
-        fuel_purchases_df = normalize_purchase_columns(fuel_purchases_df)
-        
-        # Standard column names after normalization: date, litres, cost, price_per_litre
+        # Columns were normalized at load: date, litres, cost, price_per_litre
         if 'date' not in fuel_purchases_df.columns:
             return pd.DataFrame(), 22.50
         
-        # Process dates
-        fuel_purchases_df['date'] = pd.to_datetime(fuel_purchases_df['date'], errors='coerce')
+        # Dates were already parsed by normalize_purchase_columns
         fuel_purchases_df = fuel_purchases_df.dropna(subset=['date'])
         
         # Calculate price_per_litre if needed
@@ -897,7 +1263,7 @@ def process_fuel_purchases_and_pricing(fuel_purchases_df):
 
 
 @st.cache_data(ttl=600, show_spinner=False)
-def calculate_enhanced_fuel_analysis(gen_df, fuel_history_df, fuel_purchases_df, gen_detailed_df, start_date, end_date, pricing_mode="nearest_prior"):
+def calculate_enhanced_fuel_analysis(gen_df, fuel_history_df, fuel_purchases_df, gen_detailed_df, start_date, end_date, pricing_mode="nearest_prior", backup_mode="always"):
     """Enhanced dual-source fuel analysis with accurate pricing from purchases"""
     
     # Process fuel purchases for real pricing
@@ -905,43 +1271,44 @@ def calculate_enhanced_fuel_analysis(gen_df, fuel_history_df, fuel_purchases_df,
     
     # Enhanced dual-source consumption computation (detailed CSV + backup)
     daily_primary = compute_primary_consumption(gen_df, gen_detailed_df, start_date, end_date)
-    daily_backup = compute_backup_consumption(fuel_history_df, start_date, end_date)
-    
-    # Smart combination: Use primary source preferentially, backup only when primary is missing/low
-    all_dates = sorted(set(daily_primary.index.tolist() + daily_backup.index.tolist()))
-    daily_combined = pd.Series(index=all_dates, dtype=float)
-    
-    for date in all_dates:
-        primary_val = daily_primary.get(date, 0)
-        backup_val = daily_backup.get(date, 0)
-        
-        # FIXED: Use backup (dense data - 167 readings/day) as primary source
-        # Backup source is more reliable with 57,499 records vs primary's 186 records
-        if backup_val > 0.1:  # Dense source (167 readings/day) - USE THIS FIRST
-            daily_combined[date] = backup_val
-        elif primary_val > 0.1:  # Sparse source (0.5 readings/day) - fallback only
-            daily_combined[date] = primary_val  
-        else:
-            daily_combined[date] = max(primary_val, backup_val)  # Use whichever is higher for very small values
     
+    # "auto" scans the tank-level history only when the fuel-consumed sensor is missing or flat
+    # over the range (no day with a drop of 1 L or more); otherwise the primary series stands alone
+    skip_backup = backup_mode == "off" or (backup_mode == "auto" and not daily_primary.empty)
+    if skip_backup:
+        daily_backup = pd.Series(dtype=float)
+    else:
+        daily_backup = compute_backup_consumption(fuel_history_df, start_date, end_date)
+    
+    # Smart combination: align both sources on one date index, missing days count as 0
+    all_dates = daily_primary.index.union(daily_backup.index)
+    daily_primary = daily_primary.reindex(all_dates, fill_value=0)
+    daily_backup = daily_backup.reindex(all_dates, fill_value=0)
+
+    # FIXED: Use backup (dense data - 167 readings/day) as primary source
+    # Backup source is more reliable with 57,499 records vs primary's 186 records
+    # Sparse primary (0.5 readings/day) is the fallback; for very small values use whichever is higher
+    daily_combined = daily_backup.where(
+        daily_backup > 0.1,
+        daily_primary.where(daily_primary > 0.1, np.maximum(daily_primary, daily_backup))
+    )
+
     # Build pricing series
     daily_price_series = build_daily_price_series(fuel_purchases_clean, all_dates, pricing_mode)
-    
-    # Compute daily costs
-    daily_fuel = []
-    for date in all_dates:
-        if daily_combined[date] > 0:  # Only include days with actual consumption
-            price = daily_price_series.get(date, avg_fuel_price)
-            daily_fuel.append({
-                'date': pd.to_datetime(date),
-                'fuel_consumed_liters': daily_combined[date],
-                'fuel_price_per_liter': price,
-                'daily_cost_rands': daily_combined[date] * price,
-                'primary_source': daily_primary.get(date, 0),
-                'backup_source': daily_backup.get(date, 0)
-            })
-    
-    daily_fuel_df = pd.DataFrame(daily_fuel)
+    price_arr = daily_price_series.reindex(all_dates).fillna(avg_fuel_price).values
+
+    # Compute daily costs in one vectorized pass
+    daily_fuel_df = pd.DataFrame({
+        'date': pd.to_datetime(all_dates),
+        'fuel_consumed_liters': daily_combined.values,
+        'fuel_price_per_liter': price_arr,
+        'primary_source': daily_primary.values,
+        'backup_source': daily_backup.values
+    })
+    daily_fuel_df.insert(3, 'daily_cost_rands', daily_fuel_df['fuel_consumed_liters'] * daily_fuel_df['fuel_price_per_liter'])
+
+    # Only include days with actual consumption
+    daily_fuel_df = daily_fuel_df[daily_fuel_df['fuel_consumed_liters'] > 0].reset_index(drop=True)
     
     # Calculate statistics
     stats = {}
@@ -955,30 +1322,42 @@ def calculate_enhanced_fuel_analysis(gen_df, fuel_history_df, fuel_purchases_df,
             'pricing_mode': pricing_mode,
             'real_pricing_used': True,
             'dual_source_reliability': True,
-            'fuel_consumption_trend': daily_fuel_df['fuel_consumed_liters'].tolist()[-7:] if len(daily_fuel_df) >= 7 else [],
-            'cost_trend': daily_fuel_df['daily_cost_rands'].tolist()[-7:] if len(daily_fuel_df) >= 7 else []
+            'fuel_consumption_trend': daily_fuel_df['fuel_consumed_liters'].iloc[-7:].tolist() if len(daily_fuel_df) >= 7 else [],
+            'cost_trend': daily_fuel_df['daily_cost_rands'].iloc[-7:].tolist() if len(daily_fuel_df) >= 7 else []
         }
     
     # Filter purchases for selected period
     fuel_purchases_filtered = pd.DataFrame()
     if not fuel_purchases_clean.empty:
-        date_col = [col for col in fuel_purchases_clean.columns if 'date' in col][0]
-        fuel_purchases_filtered = filter_data_by_date_range(fuel_purchases_clean, date_col, start_date, end_date)
+        fuel_purchases_filtered = filter_data_by_date_range(fuel_purchases_clean, 'date', start_date, end_date)
     
     return daily_fuel_df, stats, fuel_purchases_filtered, pd.DataFrame()
 
+NS_PER_DAY = 86_400_000_000_000
+
+def _epoch_ns(timestamps):
+    """Wall-clock nanoseconds since epoch for a datetime column (tz-aware columns use their own zone)"""
+    ts = pd.DatetimeIndex(timestamps)
+    if ts.tz is not None:
+        ts = ts.tz_localize(None)
+    return ts.as_unit('ns').asi8
+
+def _days_to_dates(series):
+    """Turn an integer-day index back into datetime.date labels"""
+    series.index = pd.Index(pd.to_datetime(series.index, unit='D').date, name='date')
+    return series
+
 def compute_primary_consumption(gen_df, gen_detailed_df, start_date, end_date):
     """CORRECTED: sensor.generator_fuel_consumed shows TANK LEVEL, not cumulative consumption"""
     
     # Try detailed CSV first (higher quality)
     if not gen_detailed_df.empty:
-        detailed_filtered = filter_data_by_date_range(gen_detailed_df, 'last_changed', start_date, end_date)
+        detailed_filtered = slice_sorted_by_date(gen_detailed_df, 'last_changed', start_date, end_date)
         fuel_data = detailed_filtered[detailed_filtered['entity_id'] == 'sensor.generator_fuel_consumed'].copy()
         
         if not fuel_data.empty:
             fuel_data['last_changed'] = pd.to_datetime(fuel_data['last_changed'])
             fuel_data['state'] = pd.to_numeric(fuel_data['state'], errors='coerce').fillna(0)
-            fuel_data = fuel_data.sort_values('last_changed')
             
             # CORRECT LOGIC: Tank level drops = actual consumption
             fuel_data['level_change'] = fuel_data['state'].diff()
@@ -986,10 +1365,10 @@ def compute_primary_consumption(gen_df, gen_detailed_df, start_date, end_date):
             # Only count NEGATIVE changes (tank level drops) as consumption
             # Positive changes are refills, not consumption
             fuel_data['consumption_diff'] = (-fuel_data['level_change']).clip(lower=0)
-            fuel_data['date'] = fuel_data['last_changed'].dt.date
+            fuel_data['day'] = _epoch_ns(fuel_data['last_changed']) // NS_PER_DAY
             
-            # Group by date and sum actual consumption
-            daily_consumption = fuel_data.groupby('date')['consumption_diff'].sum()
+            # Group by day and sum actual consumption
+            daily_consumption = _days_to_dates(fuel_data.groupby('day')['consumption_diff'].sum())
             
             # Filter out days with tiny consumption (< 1L, likely sensor noise)
             return daily_consumption[daily_consumption >= 1.0]
@@ -998,7 +1377,7 @@ def compute_primary_consumption(gen_df, gen_detailed_df, start_date, end_date):
     if gen_df.empty:
         return pd.Series(dtype=float)
     
-    gen_filtered = filter_data_by_date_range(gen_df, 'last_changed', start_date, end_date)
+    gen_filtered = slice_sorted_by_date(gen_df, 'last_changed', start_date, end_date)
     fuel_consumed_data = gen_filtered[gen_filtered['entity_id'] == 'sensor.generator_fuel_consumed'].copy()
     
     if fuel_consumed_data.empty:
@@ -1006,14 +1385,13 @@ def compute_primary_consumption(gen_df, gen_detailed_df, start_date, end_date):
     
     fuel_consumed_data['last_changed'] = pd.to_datetime(fuel_consumed_data['last_changed'])
     fuel_consumed_data['state'] = pd.to_numeric(fuel_consumed_data['state'], errors='coerce').fillna(0)
-    fuel_consumed_data = fuel_consumed_data.sort_values('last_changed')
     
     # CORRECT LOGIC: Tank level drops = actual consumption
     fuel_consumed_data['level_change'] = fuel_consumed_data['state'].diff()
     fuel_consumed_data['consumption_diff'] = (-fuel_consumed_data['level_change']).clip(lower=0)
-    fuel_consumed_data['date'] = fuel_consumed_data['last_changed'].dt.date
+    fuel_consumed_data['day'] = _epoch_ns(fuel_consumed_data['last_changed']) // NS_PER_DAY
     
-    daily_consumption = fuel_consumed_data.groupby('date')['consumption_diff'].sum()
+    daily_consumption = _days_to_dates(fuel_consumed_data.groupby('day')['consumption_diff'].sum())
     return daily_consumption[daily_consumption >= 1.0]
 
 def compute_backup_consumption(fuel_history_df, start_date, end_date):
@@ -1022,7 +1400,7 @@ def compute_backup_consumption(fuel_history_df, start_date, end_date):
         return pd.Series(dtype=float)
     
     # Filter and process
-    fuel_filtered = filter_data_by_date_range(fuel_history_df, 'last_changed', start_date, end_date)
+    fuel_filtered = slice_sorted_by_date(fuel_history_df, 'last_changed', start_date, end_date)
     fuel_level_data = fuel_filtered[fuel_filtered['entity_id'] == 'sensor.generator_fuel_level'].copy()
     
     if fuel_level_data.empty:
@@ -1030,7 +1408,6 @@ def compute_backup_consumption(fuel_history_df, start_date, end_date):
     
     fuel_level_data['last_changed'] = pd.to_datetime(fuel_level_data['last_changed'])
     fuel_level_data['state'] = pd.to_numeric(fuel_level_data['state'], errors='coerce').fillna(0)
-    fuel_level_data = fuel_level_data.sort_values('last_changed')
     
     # More aggressive smoothing for noisy tank sensor
     fuel_level_data['state_smooth'] = fuel_level_data['state'].rolling(window=20, center=True).median().fillna(fuel_level_data['state'])
@@ -1042,13 +1419,12 @@ def compute_backup_consumption(fuel_history_df, start_date, end_date):
     # 1. Drop is > 1L (significant consumption)
     # 2. Drop is < 30L (avoid counting refills/resets as consumption)
     significant_drops = (fuel_level_data['level_diff'] < -1) & (fuel_level_data['level_diff'] > -30)
-    fuel_level_data['consumption_diff'] = 0.0
-    fuel_level_data.loc[significant_drops, 'consumption_diff'] = -fuel_level_data.loc[significant_drops, 'level_diff']
+    fuel_level_data['consumption_diff'] = np.where(significant_drops.to_numpy(), -fuel_level_data['level_diff'].to_numpy(), 0.0)
     
-    fuel_level_data['date'] = fuel_level_data['last_changed'].dt.date
+    fuel_level_data['day'] = _epoch_ns(fuel_level_data['last_changed']) // NS_PER_DAY
     
-    # Group by date and sum (will be much lower now, filtering out noise)
-    daily_backup = fuel_level_data.groupby('date')['consumption_diff'].sum()
+    # Group by day and sum (will be much lower now, filtering out noise)
+    daily_backup = _days_to_dates(fuel_level_data.groupby('day')['consumption_diff'].sum())
     
     # Cap backup source to reasonable daily limits (max 50L/day to avoid anomalies)
     daily_backup = daily_backup.clip(upper=50)
@@ -1056,48 +1432,152 @@ def compute_backup_consumption(fuel_history_df, start_date, end_date):
     return daily_backup
 
 def build_daily_price_series(fuel_purchases_clean, all_dates, pricing_mode="nearest_prior"):
-    """Build daily price series using nearest-prior or monthly-average pricing"""
+    """Build daily price series (indexed by all_dates) using nearest-prior or monthly-average pricing"""
     if fuel_purchases_clean.empty:
-        return {}
-    
-    date_col = [col for col in fuel_purchases_clean.columns if 'date' in col][0]
-    purchases = fuel_purchases_clean.copy()
-    purchases[date_col] = pd.to_datetime(purchases[date_col])
+        return pd.Series(dtype=float)
+
+    # normalize_purchase_columns guarantees the canonical 'date' column
+    date_col = 'date'
+    if 'price_per_litre' not in fuel_purchases_clean.columns:
+        return pd.Series(22.50, index=all_dates)
+
+    purchases = fuel_purchases_clean[[date_col, 'price_per_litre']].copy()
+    purchases[date_col] = purchases[date_col].astype('datetime64[ns]')
     purchases = purchases.sort_values(date_col)
-    
-    daily_prices = {}
-    
+    mean_price = purchases['price_per_litre'].mean()
+    all_dates_dt = pd.to_datetime(all_dates).astype('datetime64[ns]')
+
     if pricing_mode == "nearest_prior":
-        # Forward-fill from purchase dates
-        for date in all_dates:
-            date_dt = pd.to_datetime(date)
-            prior_purchases = purchases[purchases[date_col] <= date_dt]
-            if not prior_purchases.empty and 'price_per_litre' in prior_purchases.columns:
-                daily_prices[date] = prior_purchases['price_per_litre'].iloc[-1]
-            else:
-                daily_prices[date] = purchases['price_per_litre'].mean() if 'price_per_litre' in purchases.columns else 22.50
-    
+        # Latest purchase on or before each date, via one sorted as-of join
+        dates_df = pd.DataFrame({'date': all_dates_dt})
+        merged = pd.merge_asof(
+            dates_df,
+            purchases.rename(columns={date_col: 'date'}),
+            on='date',
+            direction='backward'
+        )
+        prices = merged['price_per_litre'].values
+
     elif pricing_mode == "monthly_average":
         # Monthly average price per litre
-        purchases['month'] = purchases[date_col].dt.to_period('M')
-        monthly_avg = purchases.groupby('month')['price_per_litre'].mean()
-        
-        for date in all_dates:
-            date_dt = pd.to_datetime(date)
-            month_period = date_dt.to_period('M')
-            if month_period in monthly_avg.index:
-                daily_prices[date] = monthly_avg[month_period]
-            else:
-                daily_prices[date] = purchases['price_per_litre'].mean() if 'price_per_litre' in purchases.columns else 22.50
-    
-    return daily_prices
+        monthly_avg = purchases.groupby(purchases[date_col].dt.to_period('M'))['price_per_litre'].mean()
+        prices = monthly_avg.reindex(all_dates_dt.to_period('M')).values
+
+    else:
+        return pd.Series(dtype=float)
+
+    # Dates with no matching purchase fall back to the overall average
+    return pd.Series(prices, index=all_dates).fillna(mean_price)
+
+def month_start(dates):
+    """First day of each timestamp's month, via a datetime64[M] cast instead of Period objects"""
+    values = dates.to_numpy()
+    return pd.Series(values.astype('datetime64[M]').astype(values.dtype), index=dates.index, name='month')
+
+@st.cache_data(show_spinner=False)
+def monthly_purchase_totals(fuel_purchases, date_col, qty_col, price_col=None):
+    """Litres purchased per month, plus the mean price when a price column exists"""
+    # Only the month, quantity and price arrays are gathered; the purchase frame is never copied
+    dates = pd.to_datetime(fuel_purchases[date_col], errors='coerce')
+    valid = dates.notna().to_numpy()
+    columns = {'month': month_start(dates[valid]).to_numpy(), 'litres': fuel_purchases[qty_col].to_numpy()[valid]}
+    if price_col:
+        columns[price_col] = fuel_purchases[price_col].to_numpy()[valid]
+    monthly = pd.DataFrame(columns).groupby('month').agg({'litres': 'sum', **({price_col: 'mean'} if price_col else {})}).reset_index()
+    return monthly
+
+@st.cache_data(show_spinner=False)
+def monthly_fuel_consumption(daily_fuel):
+    """Litres consumed and fuel cost per month; the one month bucketing of the daily analysis"""
+    month = month_start(daily_fuel['date'])
+    return daily_fuel.groupby(month).agg({
+        'fuel_consumed_liters': 'sum',
+        'daily_cost_rands': 'sum'
+    }).reset_index()
+
+def monthly_generator_cost(daily_fuel):
+    """Generator fuel cost per month from the daily analysis"""
+    monthly_cost = monthly_fuel_consumption(daily_fuel)[['month', 'daily_cost_rands']]
+    return monthly_cost.rename(columns={'daily_cost_rands': 'monthly_cost_rands'})
+
+@st.cache_data(show_spinner=False)
+def monthly_purchase_vs_consumption(fuel_purchases, daily_fuel):
+    """Monthly purchased vs consumed litres and costs, with net balance and utilization"""
+    # Get purchase data by month (columns and dates were normalized at load)
+    purchase_monthly = fuel_purchases.groupby(month_start(fuel_purchases['date'])).agg({
+        'litres': 'sum',
+        'cost': 'sum'
+    })
+    purchase_monthly = purchase_monthly.rename(columns={'litres': 'purchased_litres', 'cost': 'purchase_cost'})
+    
+    # Get consumption data by month
+    consumed_monthly = monthly_fuel_consumption(daily_fuel).set_index('month').rename(columns={'fuel_consumed_liters': 'consumed_litres', 'daily_cost_rands': 'consumption_cost'})
+    
+    # Align both sides on the month index; months missing on one side count as zero
+    comparison_df = pd.concat([purchase_monthly, consumed_monthly], axis=1).sort_index().fillna(0).reset_index()
+    purchased = comparison_df['purchased_litres'].to_numpy()
+    consumed = comparison_df['consumed_litres'].to_numpy()
+    comparison_df['net_fuel'] = purchased - consumed
+    # Months without purchases report 0% rather than inf
+    with np.errstate(divide='ignore', invalid='ignore'):
+        comparison_df['utilization_rate'] = np.where(purchased > 0, consumed / purchased * 100, 0.0)
+    return comparison_df
+
+def monthly_fuel_tables(fuel_purchases, daily_fuel, price_col=None):
+    """Monthly purchases, generator cost and purchase-vs-consumption tables for the purchase section"""
+    monthly = monthly_purchase_totals(fuel_purchases, 'date', 'litres', price_col)
+    if daily_fuel.empty:
+        return monthly, pd.DataFrame(), pd.DataFrame()
+    return monthly, monthly_generator_cost(daily_fuel), monthly_purchase_vs_consumption(fuel_purchases, daily_fuel)
 
 # ==============================================================================
 # ENHANCED SOLAR ANALYSIS WITH 3-INVERTER SYSTEM
 # ==============================================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
-def process_enhanced_solar_analysis(solar_df, start_date, end_date):
+def _frame_fingerprint(df):
+    """Cache key for a time-sorted HA export: shape, columns, first/last timestamp and a hash of the readings"""
+    if df.empty or 'last_changed' not in df.columns:
+        return (len(df), tuple(df.columns))
+    # Disk-persisted entries outlive the process, so a corrected export with the same span must still miss
+    content = int(pd.util.hash_pandas_object(df['state'], index=False).sum()) if 'state' in df.columns else None
+    return (len(df), tuple(df.columns), df['last_changed'].iloc[0], df['last_changed'].iloc[-1], content)
+
+def _grouped_stats(codes, values, sums_of=None):
+    """Group count, sum and max over dense non-negative integer codes in one pass; returns only the codes present"""
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    counts = np.bincount(codes, minlength=n_groups)
+    sums = np.bincount(codes, weights=values if sums_of is None else sums_of, minlength=n_groups)
+    maxes = np.full(n_groups, -np.inf)
+    np.maximum.at(maxes, codes, values)
+    present = np.flatnonzero(counts)
+    return present, counts[present], sums[present], maxes[present]
+
+# Longest gap a reading is assumed to hold for. The export mixes hourly statistics rows with ~16 s
+# live samples, so an hour covers both; anything longer is an outage and contributes no energy.
+MAX_HOLD_HOURS = 1.0
+
+def _hold_hours(ts_ns, series_codes):
+    """Hours each reading is held until the next reading of the same series, capped at MAX_HOLD_HOURS.
+
+    The last reading of a series has no successor in the slice, so it holds for its series' previous
+    gap (sampling is assumed to carry on); a series with a single reading holds for zero hours.
+    """
+    order = np.lexsort((ts_ns, series_codes))  # by series, then time; the input need not be time-sorted
+    step = np.diff(ts_ns[order]) / 3_600_000_000_000
+    same_series = series_codes[order][1:] == series_codes[order][:-1]
+    to_next = np.zeros(len(ts_ns))
+    to_next[:-1] = np.where(same_series, step, 0.0)
+    from_prev = np.zeros(len(ts_ns))
+    from_prev[1:] = np.where(same_series, step, 0.0)
+    is_last = np.ones(len(ts_ns), dtype=bool)
+    is_last[:-1] = ~same_series
+    hold = np.empty(len(ts_ns))
+    hold[order] = np.minimum(np.where(is_last, from_prev, to_next), MAX_HOLD_HOURS)
+    return hold
+
+# Disk-persisted caches ignore ttl, so entries are bounded by max_entries instead
+@st.cache_data(show_spinner=False, max_entries=32, persist="disk", hash_funcs={pd.DataFrame: _frame_fingerprint})
+def process_enhanced_solar_analysis(solar_df, start_date, end_date, is_new_system=None):
     """Enhanced solar analysis with 3-inverter system - FIXED power scaling and aggregation"""
     
     if solar_df.empty:
@@ -1109,8 +1589,9 @@ def process_enhanced_solar_analysis(solar_df, start_date, end_date):
     if solar_filtered.empty:
         return pd.DataFrame(), {}, pd.DataFrame(), pd.DataFrame()
     
-    # Clean and process
-    solar_filtered['last_changed'] = pd.to_datetime(solar_filtered['last_changed'])
+    # Clean and process (last_changed is parsed by filter_data_by_date_range)
+    # state stays float64 (see HA_EXPORT_SCHEMA): peaks are raw readings and reach the tables and exports,
+    # and the bincount reductions below accumulate in float64 whatever the input width
     solar_filtered['state'] = pd.to_numeric(solar_filtered['state'], errors='coerce')
     
     # CRITICAL FIX: Solar power readings are already in kW scale (not W)
@@ -1118,90 +1599,114 @@ def process_enhanced_solar_analysis(solar_df, start_date, end_date):
     solar_filtered = solar_filtered[solar_filtered['state'] >= 0]
     
     # Identify power sensors (3-inverter system)
-    power_sensors = solar_filtered[solar_filtered['entity_id'].str.contains('power', case=False, na=False)]
+    # Power rows are tagged once at load; compute the mask only for frames that bypassed the loader
+    if 'is_power' in solar_filtered.columns:
+        power_mask = solar_filtered['is_power']
+    else:
+        power_mask = power_sensor_mask(solar_filtered['entity_id'])
+    power_sensors = solar_filtered[power_mask]
     
-    daily_solar = []
-    hourly_patterns = []
-    inverter_performance = []
+    daily_solar_df = pd.DataFrame()
+    hourly_patterns_df = pd.DataFrame()
+    inverter_performance_df = pd.DataFrame()
     
     if not power_sensors.empty:
         # Power values are already in correct scale - use as kW directly
-        power_sensors['power_kw'] = power_sensors['state'].abs()  # Values already in kW
-        power_sensors['date'] = power_sensors['last_changed'].dt.date
-        power_sensors['hour'] = power_sensors['last_changed'].dt.hour
+        # Derived keys live in plain arrays, so the filtered frame is never copied or mutated
+        power = power_sensors['state'].to_numpy()  # Values already in kW, non-negative after the state filter
+        ts_ns = _epoch_ns(power_sensors['last_changed'])
+        
+        # Factorize the keys once; every reduction below works on these integer codes
+        day_codes, day_numbers = pd.factorize(ts_ns // NS_PER_DAY, sort=True)
+        day_labels = pd.to_datetime(day_numbers, unit='D').date
+        inv_codes, inv_labels = pd.factorize(power_sensors['entity_id'], sort=True)
+        n_inv = len(inv_labels)
         
         # Group by inverter to track the 3-inverter system
-        inverter_daily = power_sensors.groupby(['date', 'entity_id']).agg({
-            'power_kw': ['sum', 'max', 'mean', 'count']
-        }).reset_index()
-        inverter_daily.columns = ['date', 'inverter', 'total_kwh', 'peak_kw', 'avg_kw', 'readings']
-        
-        # Convert to proper kWh based on actual data frequency
-        # Data appears to be frequent samples, so sum and divide by samples per hour
-        data_freq_per_hour = 12  # Approximately 12 samples per hour based on data density
-        inverter_daily['total_kwh'] = inverter_daily['total_kwh'] / data_freq_per_hour
-        
-        # System daily totals (sum all 3 inverters)
-        system_daily = inverter_daily.groupby('date').agg({
-            'total_kwh': 'sum',
-            'peak_kw': 'max',
-            'avg_kw': 'mean'
-        }).reset_index()
-        
-        system_daily['date'] = pd.to_datetime(system_daily['date'])
-        system_daily['inverter_count'] = inverter_daily.groupby('date')['inverter'].nunique().values
+        keys, readings, power_sum, power_max = _grouped_stats(day_codes * n_inv + inv_codes, power)
+        key_day, key_inv = np.divmod(keys, n_inv)
+        
+        # Energy from the measured timestamps: each reading holds until that inverter's next one.
+        # The export mixes hourly statistics with ~16 s live samples, so no fixed rate fits both.
+        energy_kwh = power * _hold_hours(ts_ns, inv_codes)
+        inverter_daily = pd.DataFrame({
+            'date': np.asarray(day_labels, dtype=object)[key_day],
+            'inverter': pd.Categorical.from_codes(key_inv, categories=pd.Index(inv_labels).astype(str)),
+            'total_kwh': np.bincount(day_codes * n_inv + inv_codes, weights=energy_kwh)[keys],
+            'peak_kw': power_max,
+            'avg_kw': power_sum / readings,
+            'readings': readings
+        })
+        
+        # System daily totals (sum all 3 inverters); keys are sorted, so key_day is too
+        days, inverter_count, day_kwh, day_peak = _grouped_stats(key_day, inverter_daily['peak_kw'].to_numpy(),
+                                                                  sums_of=inverter_daily['total_kwh'].to_numpy())
+        system_daily = pd.DataFrame({
+            'date': pd.to_datetime(np.asarray(day_labels, dtype=object)[days]),
+            'total_kwh': day_kwh,
+            'peak_kw': day_peak,
+            'avg_kw': np.bincount(key_day, weights=inverter_daily['avg_kw'].to_numpy())[days] / inverter_count,
+            'inverter_count': inverter_count
+        })
         system_daily['capacity_factor'] = (system_daily['avg_kw'] / system_daily['peak_kw'] * 100).fillna(0)
         
-        # Ensure all values are positive
-        system_daily['total_kwh'] = system_daily['total_kwh'].abs()
-        system_daily['peak_kw'] = system_daily['peak_kw'].abs()
-        system_daily['avg_kw'] = system_daily['avg_kw'].abs()
-        
-        daily_solar = system_daily.to_dict('records')
+        daily_solar_df = system_daily
         
         # Hourly patterns
-        hourly_avg = power_sensors.groupby('hour').agg({
-            'power_kw': ['mean', 'max', 'std', 'count']
-        }).reset_index()
-        hourly_avg.columns = ['hour', 'avg_power_kw', 'max_power_kw', 'variability', 'data_points']
-        hourly_patterns = hourly_avg.to_dict('records')
+        # Hour is a 24-bucket key, so plain bincounts replace the grouped sort
+        hour_codes = (ts_ns // 3_600_000_000_000) % 24
+        hour_count = np.bincount(hour_codes, minlength=24)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_by_hour = np.bincount(hour_codes, weights=power, minlength=24) / hour_count
+        max_by_hour = np.full(24, -np.inf)
+        np.maximum.at(max_by_hour, hour_codes, power)
+        sq_dev = np.bincount(hour_codes, weights=(power - mean_by_hour[hour_codes]) ** 2, minlength=24)
+        
+        hours = np.flatnonzero(hour_count)
+        data_points = hour_count[hours]
+        hour_mean = mean_by_hour[hours]
+        hour_max = max_by_hour[hours]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variability = np.where(data_points > 1, np.sqrt(sq_dev[hours] / (data_points - 1)), np.nan)
+        hourly_avg = pd.DataFrame({
+            'hour': hours,
+            'avg_power_kw': hour_mean,
+            'max_power_kw': hour_max,
+            'variability': variability,
+            'data_points': data_points
+        })
+        hourly_patterns_df = hourly_avg
         
         # Individual inverter performance
-        inverter_performance = inverter_daily.to_dict('records')
+        inverter_performance_df = inverter_daily
     
     # Calculate enhanced statistics
-    daily_solar_df = pd.DataFrame(daily_solar)
-    hourly_patterns_df = pd.DataFrame(hourly_patterns)
-    inverter_performance_df = pd.DataFrame(inverter_performance)
-    
     solar_stats = {}
     if not daily_solar_df.empty:
         electricity_rate = 1.50  # R/kWh
-        total_generation = daily_solar_df['total_kwh'].sum()
+        # One pass over the daily frame for every summary figure
+        daily_agg = daily_solar_df[['total_kwh', 'peak_kw', 'capacity_factor', 'inverter_count']].agg(['sum', 'mean', 'max', 'min'])
+        total_generation = daily_agg.at['sum', 'total_kwh']
         
         # Enhanced stats for new 3-inverter system
-        avg_inverter_count = daily_solar_df['inverter_count'].mean()
-        is_new_system = False
-        if not solar_df.empty and 'system_type' in solar_df.columns:
-            try:
-                is_new_system = solar_df['system_type'].astype(str).str.contains('3-Inverter', na=False).any()
-            except Exception:
-                is_new_system = False
+        avg_inverter_count = daily_agg.at['mean', 'inverter_count']
+        if is_new_system is None:
+            is_new_system = is_new_solar_system(solar_df)
         
         # Calculate system improvements
         baseline_capacity = 25  # kW (estimated previous system capacity)
-        current_peak = daily_solar_df['peak_kw'].max()
+        current_peak = daily_agg.at['max', 'peak_kw']
         capacity_improvement = ((current_peak - baseline_capacity) / baseline_capacity * 100) if current_peak > baseline_capacity else 0
         
         solar_stats = {
             'total_generation_kwh': total_generation,
             'total_value_rands': total_generation * electricity_rate,
-            'average_daily_kwh': daily_solar_df['total_kwh'].mean(),
+            'average_daily_kwh': daily_agg.at['mean', 'total_kwh'],
             'peak_system_power_kw': current_peak,
-            'average_capacity_factor': daily_solar_df['capacity_factor'].mean(),
-            'best_day_kwh': daily_solar_df['total_kwh'].max(),
-            'worst_day_kwh': daily_solar_df['total_kwh'].min(),
-            'generation_trend': daily_solar_df['total_kwh'].tolist()[-7:] if len(daily_solar_df) >= 7 else [],
+            'average_capacity_factor': daily_agg.at['mean', 'capacity_factor'],
+            'best_day_kwh': daily_agg.at['max', 'total_kwh'],
+            'worst_day_kwh': daily_agg.at['min', 'total_kwh'],
+            'generation_trend': daily_solar_df['total_kwh'].iloc[-7:].tolist() if len(daily_solar_df) >= 7 else [],
             'total_operating_days': len(daily_solar_df),
             'average_inverter_count': avg_inverter_count,
             'carbon_offset_kg': total_generation * 0.95,
@@ -1226,17 +1731,52 @@ def filter_data_by_date_range(df, date_col, start_date, end_date):
         return df
     
     try:
-        df = df.copy()
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        # Loaders already parse timestamps; only convert (and copy) when needed
+        if df[date_col].dtype.kind != 'M':
+            df = df.copy()
+            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        # Sorted columns (HA exports are sorted at load) are sliced by binary search
+        if df[date_col].is_monotonic_increasing:
+            lo, hi = _date_slice_bounds(df[date_col], start_date, end_date)
+            return df.iloc[lo:hi].copy()
         mask = (df[date_col].dt.date >= start_date) & (df[date_col].dt.date <= end_date)
         return df[mask].copy()
     except:
         return df
 
+def _date_slice_bounds(col, start_date, end_date):
+    """Positions of [start_date 00:00, end_date + 1 day) in a sorted datetime column"""
+    lo = col.searchsorted(pd.Timestamp(start_date, tz=col.dt.tz), side='left')
+    hi = col.searchsorted(pd.Timestamp(end_date + timedelta(days=1), tz=col.dt.tz), side='left')
+    return lo, hi
+
+def slice_sorted_by_date(df, date_col, start_date, end_date):
+    """Date-range slice of a frame already sorted on date_col, using binary search"""
+    if df.empty or date_col not in df.columns:
+        return df
+    
+    col = df[date_col]
+    if not (pd.api.types.is_datetime64_any_dtype(col) and col.is_monotonic_increasing):
+        filtered = filter_data_by_date_range(df, date_col, start_date, end_date)
+        return filtered.sort_values(date_col, kind='stable') if date_col in filtered.columns else filtered
+    
+    lo, hi = _date_slice_bounds(col, start_date, end_date)
+    return df.iloc[lo:hi]
+
 # ==============================================================================
 # DATE RANGE SELECTOR
 # ==============================================================================
 
+# Rolling presets: label -> days back from today (inclusive of today)
+DATE_RANGE_PRESETS = {
+    "Last 7 Days (This Week)": 6,
+    "Last 14 Days (Two Weeks)": 13,
+    "Last 30 Days (This Month)": 29,
+    "Last 60 Days (Two Months)": 59,
+    "Last 90 Days (Three Months)": 89,
+    "Last 6 Months": 180
+}
+
 def create_date_range_selector(key_prefix="global"):
     """Simple date range selector for everyone"""
     
@@ -1248,17 +1788,7 @@ def create_date_range_selector(key_prefix="global"):
     with col1:
         preset = st.selectbox(
             "Choose a time period",
-            [
-                "Last 7 Days (This Week)", 
-                "Last 14 Days (Two Weeks)", 
-                "Last 30 Days (This Month)", 
-                "Last 60 Days (Two Months)", 
-                "Last 90 Days (Three Months)", 
-                "Last 6 Months", 
-                "This Year", 
-                "All Available Data", 
-                "Pick My Own Dates"
-            ],
+            [*DATE_RANGE_PRESETS, "This Year", "All Available Data", "Pick My Own Dates"],
             index=2,
             key=f"{key_prefix}_preset",
             help="Choose how far back you want to look at your data"
@@ -1266,18 +1796,8 @@ def create_date_range_selector(key_prefix="global"):
     
     today = datetime.now().date()
     
-    if "7 Days" in preset:
-        start_date, end_date = today - timedelta(days=6), today
-    elif "14 Days" in preset:
-        start_date, end_date = today - timedelta(days=13), today
-    elif "30 Days" in preset:
-        start_date, end_date = today - timedelta(days=29), today
-    elif "60 Days" in preset:
-        start_date, end_date = today - timedelta(days=59), today
-    elif "90 Days" in preset:
-        start_date, end_date = today - timedelta(days=89), today
-    elif "6 Months" in preset:
-        start_date, end_date = today - timedelta(days=180), today
+    if preset in DATE_RANGE_PRESETS:
+        start_date, end_date = today - timedelta(days=DATE_RANGE_PRESETS[preset]), today
     elif "This Year" in preset:
         start_date, end_date = date(today.year, 1, 1), today
     elif "All Available" in preset:
@@ -1305,6 +1825,9 @@ def create_date_range_selector(key_prefix="global"):
         with col3:
             st.date_input("End Date", value=end_date, disabled=True, key=f"{key_prefix}_end_display")
     
+    # One key type for the cached analyses: plain dates, never datetimes or Timestamps
+    start_date, end_date = pd.Timestamp(start_date).date(), pd.Timestamp(end_date).date()
+    
     period_days = (end_date - start_date).days + 1
     st.success(f"✅ **Showing {period_days} days** • From {start_date.strftime('%B %d, %Y')} to {end_date.strftime('%B %d, %Y')}")
     
@@ -1314,81 +1837,158 @@ def create_date_range_selector(key_prefix="global"):
 # ENHANCED CHART FUNCTIONS (FIXED use_container_width)
 # ==============================================================================
 
-def create_ultra_interactive_chart(df, x_col, y_col, title, color="#3b82f6", chart_type="bar", 
-                                 height=500, enable_zoom=True, enable_selection=True, selection_mode="select"):
-    """Ultra-interactive charts with advanced zoom, pan, and selection capabilities"""
-    
-    if df.empty or x_col not in df.columns or y_col not in df.columns:
-        st.info(f"📊 No data available for {title}")
-        return None, None
+# Scatter, line and area traces above this many points render through WebGL (go.Scattergl)
+WEBGL_MIN_POINTS = 1000
+# Interactive time-series charts are M4-downsampled to at most this many points
+CHART_MAX_POINTS = 5000
+
+def m4_aggregate(df, time_col, value_col, width_px=2400):
+    """M4 downsampling: keep first, last, min and max of each pixel column so line shapes survive"""
+    if len(df) <= 4 * width_px or time_col not in df.columns or value_col not in df.columns:
+        return df
     
+    valid = df[df[time_col].notna() & df[value_col].notna()]
+    if len(valid) <= 4 * width_px:
+        return valid
+    
+    t = pd.DatetimeIndex(valid[time_col]).as_unit('ns').asi8
+    order = np.argsort(t, kind='stable')
+    t = t[order]
+    span = max(t[-1] - t[0], 1)
+    bins = np.minimum(((t - t[0]) / span * width_px).astype(np.int64), width_px - 1)
+    
+    g = pd.Series(valid[value_col].to_numpy()[order]).groupby(bins)
+    first = np.unique(bins, return_index=True)[1]
+    last = len(bins) - 1 - np.unique(bins[::-1], return_index=True)[1]
+    keep = np.unique(np.concatenate([first, last, g.idxmin().to_numpy(), g.idxmax().to_numpy()]))
+    return valid.iloc[order[keep]]
+
+def scatter_trace_type(n_points):
+    """go.Scattergl for large traces; small ones stay SVG, since browsers cap WebGL contexts per page"""
+    return go.Scattergl if n_points > WEBGL_MIN_POINTS else go.Scatter
+
+def _make_bar(df, x_col, y_col, color, title):
+    return go.Bar(
+        x=df[x_col],
+        y=df[y_col],
+        marker=dict(
+            color=color,
+            line=dict(width=0),
+            opacity=0.8
+        ),
+        texttemplate='%{y:.2f}',
+        textposition='auto',
+        textfont=dict(color='white', size=10),
+        hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
+        name=title
+    )
+
+def _make_line(df, x_col, y_col, color, title):
+    # WebGL has no spline shape, so short series keep the smoothed SVG line
+    use_webgl = len(df) > WEBGL_MIN_POINTS
+    return (go.Scattergl if use_webgl else go.Scatter)(
+        x=df[x_col],
+        y=df[y_col],
+        mode='lines+markers',
+        line=dict(color=color, width=3, shape='linear' if use_webgl else 'spline'),
+        marker=dict(
+            size=8,
+            color=color,
+            line=dict(width=2, color='rgba(255,255,255,0.5)'),
+            opacity=0.9
+        ),
+        hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
+        name=title
+    )
+
+def _make_area(df, x_col, y_col, color, title):
+    return scatter_trace_type(len(df))(
+        x=df[x_col],
+        y=df[y_col],
+        fill='tozeroy',
+        mode='lines',
+        line=dict(color=color, width=2),
+        fillcolor=f"rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.3)",
+        hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
+        name=title
+    )
+
+def _make_scatter(df, x_col, y_col, color, title):
+    return scatter_trace_type(len(df))(
+        x=df[x_col],
+        y=df[y_col],
+        mode='markers',
+        marker=dict(
+            size=10,
+            color=color,
+            opacity=0.7,
+            line=dict(width=1, color='white')
+        ),
+        hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
+        name=title
+    )
+
+_CHART_TRACE_BUILDERS = {'bar': _make_bar, 'line': _make_line, 'area': _make_area, 'scatter': _make_scatter}
+
+# Layout shared by every interactive chart; title, height and axis titles are set per chart
+_CHART_BASE_LAYOUT = dict(
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#e2e8f0', family="Inter"),
+    showlegend=False,
+    hovermode="x unified",
+    xaxis=dict(
+        showgrid=True,
+        gridcolor='rgba(255,255,255,0.05)',
+        gridwidth=1,
+        linecolor='rgba(148, 163, 184, 0.2)',
+        zeroline=False,
+        tickfont=dict(color='#94a3b8', size=11)
+    ),
+    yaxis=dict(
+        showgrid=True,
+        gridcolor='rgba(255,255,255,0.05)',
+        gridwidth=1,
+        linecolor='rgba(148, 163, 184, 0.2)',
+        zeroline=False,
+        tickfont=dict(color='#94a3b8', size=11)
+    ),
+    margin=dict(l=80, r=40, t=80, b=80),
+    hoverlabel=dict(
+        bgcolor="rgba(15, 23, 42, 0.95)",
+        bordercolor="rgba(148, 163, 184, 0.3)",
+        font=dict(color="#f1f5f9", family="Inter", size=12)
+    )
+)
+
+def _chart_signature(df):
+    """Cheap cache key for chart input: shape, columns, first/last row and per-column sums"""
+    if df.empty:
+        return (len(df), tuple(df.columns))
+    numeric = df.select_dtypes('number')
+    return (len(df), tuple(df.columns), tuple(df.iloc[0]), tuple(df.iloc[-1]), tuple(numeric.sum().round(6)))
+
+@st.cache_data(show_spinner=False, max_entries=64, hash_funcs={pd.DataFrame: _chart_signature})
+def _build_chart_figure(df, x_col, y_col, title, color, chart_type, height):
+    """Cleaned chart data and its figure, reused across reruns while the inputs are unchanged"""
     # Clean data
     df_clean = df.dropna(subset=[x_col, y_col]).copy()
     
     if df_clean.empty:
-        st.info(f"📊 No valid data for {title}")
-        return None, None
+        return None, df_clean
     
-    fig = go.Figure()
+    # Long time series: keep each bucket's first/last/min/max instead of shipping every point
+    if len(df_clean) > CHART_MAX_POINTS and df_clean[x_col].dtype.kind == 'M':
+        df_clean = m4_aggregate(df_clean, x_col, y_col, width_px=CHART_MAX_POINTS // 4)
+    
+    fig = go.Figure(layout=_CHART_BASE_LAYOUT)
     
     # Create trace based on chart type
-    if chart_type == "bar":
-        fig.add_trace(go.Bar(
-            x=df_clean[x_col],
-            y=df_clean[y_col],
-            marker=dict(
-                color=color,
-                line=dict(width=0),
-                opacity=0.8
-            ),
-            text=df_clean[y_col].round(2),
-            textposition='auto',
-            textfont=dict(color='white', size=10),
-            hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
-            name=title
-        ))
-    elif chart_type == "line":
-        fig.add_trace(go.Scatter(
-            x=df_clean[x_col],
-            y=df_clean[y_col],
-            mode='lines+markers',
-            line=dict(color=color, width=3, shape='spline'),
-            marker=dict(
-                size=8,
-                color=color,
-                line=dict(width=2, color='rgba(255,255,255,0.5)'),
-                opacity=0.9
-            ),
-            hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
-            name=title
-        ))
-    elif chart_type == "area":
-        fig.add_trace(go.Scatter(
-            x=df_clean[x_col],
-            y=df_clean[y_col],
-            fill='tozeroy',
-            mode='lines',
-            line=dict(color=color, width=2),
-            fillcolor=f"rgba({int(color[1:3], 16)}, {int(color[3:5], 16)}, {int(color[5:7], 16)}, 0.3)",
-            hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
-            name=title
-        ))
-    elif chart_type == "scatter":
-        fig.add_trace(go.Scatter(
-            x=df_clean[x_col],
-            y=df_clean[y_col],
-            mode='markers',
-            marker=dict(
-                size=10,
-                color=color,
-                opacity=0.7,
-                line=dict(width=1, color='white')
-            ),
-            hovertemplate="<b>%{x}</b><br>%{y:.2f}<br><extra></extra>",
-            name=title
-        ))
+    make_trace = _CHART_TRACE_BUILDERS.get(chart_type)
+    if make_trace is not None:
+        fig.add_trace(make_trace(df_clean, x_col, y_col, color, title))
     
-    # Enhanced layout
+    # Per-chart layout on top of the shared base
     fig.update_layout(
         title=dict(
             text=f"<b style='color: #f1f5f9;'>{title}</b>",
@@ -1397,46 +1997,35 @@ def create_ultra_interactive_chart(df, x_col, y_col, title, color="#3b82f6", cha
             y=0.95,
             xanchor='left'
         ),
-        paper_bgcolor='rgba(0,0,0,0)',
-        plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#e2e8f0', family="Inter"),
         height=height,
-        showlegend=False,
-        hovermode="x unified",
-        xaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255,255,255,0.05)',
-            gridwidth=1,
-            linecolor='rgba(148, 163, 184, 0.2)',
-            zeroline=False,
-            tickfont=dict(color='#94a3b8', size=11),
-            title=dict(
-                text=x_col.replace('_', ' ').title(),
-                font=dict(color='#94a3b8', size=12, family="Inter"),
-                standoff=20
-            )
-        ),
-        yaxis=dict(
-            showgrid=True,
-            gridcolor='rgba(255,255,255,0.05)',
-            gridwidth=1,
-            linecolor='rgba(148, 163, 184, 0.2)',
-            zeroline=False,
-            tickfont=dict(color='#94a3b8', size=11),
-            title=dict(
-                text=y_col.replace('_', ' ').title(),
-                font=dict(color='#94a3b8', size=12, family="Inter"),
-                standoff=20
-            )
+        xaxis_title=dict(
+            text=x_col.replace('_', ' ').title(),
+            font=dict(color='#94a3b8', size=12, family="Inter"),
+            standoff=20
         ),
-        margin=dict(l=80, r=40, t=80, b=80),
-        hoverlabel=dict(
-            bgcolor="rgba(15, 23, 42, 0.95)",
-            bordercolor="rgba(148, 163, 184, 0.3)",
-            font=dict(color="#f1f5f9", family="Inter", size=12)
+        yaxis_title=dict(
+            text=y_col.replace('_', ' ').title(),
+            font=dict(color='#94a3b8', size=12, family="Inter"),
+            standoff=20
         )
     )
     
+    return fig, df_clean
+
+def create_ultra_interactive_chart(df, x_col, y_col, title, color="#3b82f6", chart_type="bar", 
+                                 height=500, enable_zoom=True, enable_selection=True, selection_mode="select"):
+    """Ultra-interactive charts with advanced zoom, pan, and selection capabilities"""
+    
+    if df.empty or x_col not in df.columns or y_col not in df.columns:
+        st.info(f"📊 No data available for {title}")
+        return None, None
+    
+    fig, df_clean = _build_chart_figure(df, x_col, y_col, title, color, chart_type, height)
+    
+    if fig is None:
+        st.info(f"📊 No valid data for {title}")
+        return None, None
+    
     # Advanced configuration
     config = {
         'displayModeBar': True,
@@ -1473,6 +2062,71 @@ def create_ultra_interactive_chart(df, x_col, y_col, title, color="#3b82f6", cha
     
     return fig, df_clean
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def csv_bytes(df):
+    """UTF-8 CSV payload for a download button, serialized once per distinct frame"""
+    # One writer for every size, so an export keeps its format whatever date range is selected
+    return df.to_csv(index=False).encode('utf-8')
+
+def deferred_csv(df):
+    """Download-button payload that is only serialized when the button is clicked, not on every rerun"""
+    return partial(csv_bytes, df)
+
+@st.fragment
+def render_chart_with_download(df, x_col, y_col, title, color, chart_type, download_label, file_name, download_key, **chart_kwargs):
+    """Chart plus CSV export of its data; a download click reruns only this fragment, not the whole page"""
+    fig, chart_df = create_ultra_interactive_chart(df, x_col, y_col, title, color, chart_type, **chart_kwargs)
+    if chart_df is not None:
+        st.download_button(download_label, deferred_csv(chart_df), file_name=file_name, mime="text/csv", key=download_key)
+
+@st.fragment
+def render_fuel_usage_charts(daily_fuel):
+    """Daily fuel consumption and cost side by side; the selection mode is read from session state"""
+    selection_mode = st.session_state.get("selection_mode", "Box Select")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        render_chart_with_download(
+            daily_fuel, 'date', 'fuel_consumed_liters',
+            'Daily Fuel Consumption (Enhanced)', '#3b82f6', 'bar',
+            "⬇️ Download Chart Data (Fuel Consumption)", "fuel_consumption_chart.csv", "dl_chart_fuel_consumption",
+            height=400, enable_zoom=True, enable_selection=True, selection_mode=selection_mode
+        )
+    
+    with col2:
+        render_chart_with_download(
+            daily_fuel, 'date', 'daily_cost_rands',
+            'Daily Fuel Cost (Real Pricing)', '#ef4444', 'area',
+            "⬇️ Download Chart Data (Fuel Cost)", "fuel_cost_chart.csv", "dl_chart_fuel_cost",
+            height=400, enable_zoom=True, enable_selection=True, selection_mode=selection_mode
+        )
+
+@st.cache_data(show_spinner=False, max_entries=16, hash_funcs={pd.DataFrame: _chart_signature})
+def build_purchase_vs_consumption_figure(comparison_df):
+    """Grouped monthly bars of purchased vs consumed litres"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=comparison_df['month'],
+        y=comparison_df['purchased_litres'],
+        name='Purchased (L)',
+        marker_color='#10b981'
+    ))
+    fig.add_trace(go.Bar(
+        x=comparison_df['month'],
+        y=comparison_df['consumed_litres'],
+        name='Consumed (L)',
+        marker_color='#ef4444'
+    ))
+    
+    fig.update_layout(
+        title="Monthly Fuel: Purchased vs Consumed",
+        xaxis_title="Month",
+        yaxis_title="Litres",
+        barmode='group',
+        height=400
+    )
+    return fig
+
 # ==============================================================================
 # MAIN APPLICATION (WITH ALL IMPROVEMENTS)
 # ==============================================================================
@@ -1578,10 +2232,11 @@ def render_generator_efficiency_section(gen_df, start_date, end_date):
     
     # Efficiency trend chart
     fig = go.Figure()
+    plot_df = m4_aggregate(efficiency_df, 'last_changed', 'state')
     
-    fig.add_trace(go.Scatter(
-        x=efficiency_df['last_changed'],
-        y=efficiency_df['state'],
+    fig.add_trace(scatter_trace_type(len(plot_df))(
+        x=plot_df['last_changed'],
+        y=plot_df['state'],
         name='Efficiency',
         mode='lines+markers',
         line=dict(color='#f59e0b', width=2),
@@ -1680,7 +2335,7 @@ def render_generator_efficiency_section(gen_df, start_date, end_date):
     # Download efficiency data
     st.download_button(
         "⬇️ Download Efficiency Data",
-        efficiency_df[['last_changed', 'state']].to_csv(index=False).encode('utf-8'),
+        deferred_csv(efficiency_df[['last_changed', 'state']]),
         file_name=f"generator_efficiency_{start_date}_to_{end_date}.csv",
         mime="text/csv",
         key="dl_efficiency_data"
@@ -1924,7 +2579,7 @@ def render_runtime_analysis_section(gen_df, start_date, end_date):
     # Download runtime data
     st.download_button(
         "⬇️ Download Runtime Data",
-        runtime_df[['last_changed', 'state']].to_csv(index=False).encode('utf-8'),
+        deferred_csv(runtime_df[['last_changed', 'state']]),
         file_name=f"generator_runtime_{start_date}_to_{end_date}.csv",
         mime="text/csv",
         key="dl_runtime_data"
@@ -2033,7 +2688,7 @@ def render_fuel_tank_analysis_section(gen_df, fuel_history_df, start_date, end_d
     
     fig = go.Figure()
     
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter_trace_type(len(valid_runs))(
         x=valid_runs['last_changed'],
         y=valid_runs['consumption_per_run'],
         mode='markers+lines',
@@ -2220,7 +2875,7 @@ def render_fuel_tank_analysis_section(gen_df, fuel_history_df, start_date, end_d
     # Download per-run data
     st.download_button(
         "⬇️ Download Per-Run Data",
-        valid_runs[['last_changed', 'state_start', 'state_stop', 'consumption_per_run']].to_csv(index=False).encode('utf-8'),
+        deferred_csv(valid_runs[['last_changed', 'state_start', 'state_stop', 'consumption_per_run']]),
         file_name=f"fuel_per_run_{start_date}_to_{end_date}.csv",
         mime="text/csv",
         key="dl_per_run_data"
@@ -2357,10 +3012,8 @@ def render_solar_comparison_with_warnings(old_solar_df, new_solar_df, start_date
         
         render_data_quality_indicator(quality_score)
     
-    st.markdown("---")
-    
     # Continue with preliminary metrics BUT with clear disclaimers
-    st.markdown("#### Preliminary Performance Metrics")
+    st.markdown("---\n\n#### Preliminary Performance Metrics")
     st.caption("⚠️ Note: Different time periods may affect comparison accuracy")
     
     # Process new system data
@@ -2484,10 +3137,13 @@ def render_data_quality_dashboard():
         date_col = 'last_changed' if 'last_changed' in df.columns else df.columns[0]
         
         try:
-            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-            df_clean = df.dropna(subset=[date_col])
+            # Loaders already parse timestamps; only parse (without touching the shared frame) when they did not
+            dates = df[date_col]
+            if not pd.api.types.is_datetime64_any_dtype(dates):
+                dates = pd.to_datetime(dates, errors='coerce')
+            dates = dates.dropna()
             
-            if df_clean.empty:
+            if dates.empty:
                 quality_data.append({
                     'Data Source': source_name,
                     'Status': '⚠️ Invalid Dates',
@@ -2501,8 +3157,9 @@ def render_data_quality_dashboard():
                 continue
             
             # Calculate metrics
-            date_range_days = (df_clean[date_col].max() - df_clean[date_col].min()).days + 1
-            records_per_day = len(df_clean) / max(date_range_days, 1)
+            first_date, last_date = dates.min(), dates.max()
+            date_range_days = (last_date - first_date).days + 1
+            records_per_day = len(dates) / max(date_range_days, 1)
             
             # Calculate quality score
             if records_per_day > 100:
@@ -2522,15 +3179,16 @@ def render_data_quality_dashboard():
                 grade = "Poor"
                 status = "⚠️ Very Sparse"
             
-            # Check for data gaps
-            time_diffs = df_clean.sort_values(date_col)[date_col].diff()
-            large_gaps = len(time_diffs[time_diffs > pd.Timedelta(hours=24)])
+            # Check for data gaps (HA exports are loaded sorted, so the sort is usually skipped)
+            if not dates.is_monotonic_increasing:
+                dates = dates.sort_values()
+            large_gaps = int((dates.diff() > pd.Timedelta(hours=24)).sum())
             
             quality_data.append({
                 'Data Source': source_name,
                 'Status': status,
-                'Records': f"{len(df_clean):,}",
-                'Date Range': f"{df_clean[date_col].min().date()} to {df_clean[date_col].max().date()}",
+                'Records': f"{len(dates):,}",
+                'Date Range': f"{first_date.date()} to {last_date.date()}",
                 'Days': date_range_days,
                 'Readings/Day': f"{records_per_day:.1f}",
                 'Quality Score': quality_score,
@@ -2553,14 +3211,14 @@ def render_data_quality_dashboard():
     # Create quality table
     quality_df = pd.DataFrame(quality_data)
     
-    # Display with color coding
+    # Display with color coding (plain table when matplotlib is not installed)
     st.dataframe(
         quality_df.style.background_gradient(
             subset=['Quality Score'], 
             cmap='RdYlGn', 
             vmin=0, 
             vmax=100
-        ),
+        ) if MATPLOTLIB_AVAILABLE else quality_df,
         use_container_width=True,
         height=400
     )
@@ -2603,9 +3261,9 @@ def render_data_quality_dashboard():
         if not all_data.get('generator', pd.DataFrame()).empty:
             gen_df = all_data['generator']
             if 'last_changed' in gen_df.columns:
-                gen_df['last_changed'] = pd.to_datetime(gen_df['last_changed'], errors='coerce')
-                latest_data = gen_df['last_changed'].max()
-                hours_old = (pd.Timestamp.now() - latest_data).total_seconds() / 3600
+                # The frame is shared with the cache, so parse a copy; compare in the column's own zone
+                latest_data = pd.to_datetime(gen_df['last_changed'], errors='coerce').max()
+                hours_old = (pd.Timestamp.now(tz=latest_data.tz) - latest_data).total_seconds() / 3600
                 
                 if hours_old < 24:
                     freshness = "Live"
@@ -2696,7 +3354,7 @@ def render_data_quality_dashboard():
     with col_export1:
         st.download_button(
             "⬇️ Download Quality Report (CSV)",
-            quality_df.to_csv(index=False).encode('utf-8'),
+            deferred_csv(quality_df),
             file_name=f"data_quality_report_{datetime.now().strftime('%Y%m%d')}.csv",
             mime="text/csv",
             key="dl_quality_report"
@@ -2733,11 +3391,6 @@ RECOMMENDATIONS:
             key="dl_full_report"
         )
 
-    
-    # NEW: Data Quality Dashboard Tab
-    with tab5:
-        render_data_quality_dashboard()
-
 def main():
     """Ultra-modern improved main application - ENHANCED UI VERSION"""
     
@@ -2788,10 +3441,17 @@ def main():
                     selections[target] = st.selectbox(f"{mapping_key} → {target}", options, key=f"map_{mapping_key}_{target}")
             if selections:
                 df = df.rename(columns=selections)
+                # Mapped columns skip the loader schema; keep entity_id keys as integer codes
+                if 'entity_id' in df.columns and not isinstance(df['entity_id'].dtype, pd.CategoricalDtype):
+                    df['entity_id'] = df['entity_id'].astype('category')
         return df
 
     # Apply mapping to generator and solar datasets if needed
-    all_data['generator'] = apply_column_mapping(all_data.get('generator', pd.DataFrame()), 'Generator')
+    generator = all_data.get('generator', pd.DataFrame())
+    all_data['generator'] = apply_column_mapping(generator, 'Generator')
+    if all_data['generator'] is not generator:
+        # The load-time entity slices came from the unmapped frame
+        all_data['generator_by_entity'] = split_by_entity(all_data['generator'])
     all_data['solar'] = apply_column_mapping(all_data.get('solar', pd.DataFrame()), 'Solar')
     
     # Global date range selector
@@ -2804,34 +3464,29 @@ def main():
         
         # Data Manager: download/update data sources
         with st.expander("🗂️ Data Manager (download/update data files)", expanded=False):
-            BASE = "https://raw.githubusercontent.com/Saint-Akim/Solar-performance/main/"
-            downloads = {
-                "New_inverter.csv": BASE + "New_inverter.csv",
-                "FACTORY ELEC.csv": BASE + "FACTORY%20ELEC.csv",
-                "Solar_Goodwe&Fronius-Jan.csv": BASE + "Solar_Goodwe%26Fronius-Jan.csv",
-                "Solar_goodwe&Fronius_April.csv": BASE + "Solar_goodwe%26Fronius_April.csv",
-                "Solar_goodwe&Fronius_may.csv": BASE + "Solar_goodwe%26Fronius_may.csv",
-                "gen (2).csv": BASE + "gen%20%282%29.csv",
-                "gen (2).xlsx": BASE + "gen%20%282%29.xlsx",
-                "history (5).csv": BASE + "history%20%285%29.csv",
-                "history (5).xlsx": BASE + "history%20%285%29.xlsx",
-                "Durr bottling Generator filling.xlsx": BASE + "Durr%20bottling%20Generator%20filling.xlsx",
-                "September 2025.xlsx": BASE + "September%202025.xlsx",
-            }
+            if st.button("⬇️ Download All", key="dm_all"):
+                results = download_files(DATA_DOWNLOADS)
+                for fname, status in results.items():
+                    if isinstance(status, Exception):
+                        st.error(f"Download failed for {fname}: {status}")
+                    elif status != 200:
+                        st.warning(f"Could not fetch {fname}: {status}")
+                saved = [fname for fname, status in results.items() if status == 200]
+                if saved:
+                    st.success(f"Saved {len(saved)} of {len(results)} files")
+                    # One cache reset for the whole batch
+                    st.cache_data.clear()
             dm_cols = st.columns(2)
-            for i, (fname, url) in enumerate(downloads.items()):
-                with dm_cols[i % 2]:
+            for dm_col, (fname, url) in zip(cycle(dm_cols), DATA_DOWNLOADS):
+                with dm_col:
                     if st.button(f"⬇️ {fname}", key=f"dm_{fname}"):
                         try:
-                            import requests
-                            r = requests.get(url, timeout=30)
-                            if r.status_code == 200:
-                                with open(fname, "wb") as f:
-                                    f.write(r.content)
+                            status = _download_file(url, fname)
+                            if status == 200:
                                 st.success(f"Saved {fname}")
                                 st.cache_data.clear()
                             else:
-                                st.warning(f"Could not fetch {fname}: {r.status_code}")
+                                st.warning(f"Could not fetch {fname}: {status}")
                         except Exception as e:
                             st.error(f"Download failed for {fname}: {e}")
         
@@ -2839,10 +3494,8 @@ def main():
         st.markdown("### 🧭 Data Column Mapping")
         st.caption("If your files use different column names, map them here.")
         st.markdown("#### Enhanced v10.0 • Real-Time Intelligence")
-        st.markdown("---")
-        
         # Enhanced preferences
-        st.markdown("### 🎛️ Dashboard Preferences")
+        st.markdown("---\n\n### 🎛️ Dashboard Preferences")
         
         chart_theme = st.selectbox(
             "Chart Theme",
@@ -2855,14 +3508,22 @@ def main():
         selection_mode = st.selectbox(
             "Selection Mode",
             ["Box Select", "Lasso Select", "Pan", "Zoom"],
+            key="selection_mode",
             help="Choose how to interact with charts"
         )
         pricing_mode = st.selectbox(
             "Fuel Pricing Mode",
             ["nearest_prior", "monthly_average"],
             index=0,
+            key="pricing_mode",
             help="Nearest prior: Use closest purchase price per day (recommended). Monthly average: Use monthly mean price."
         )
+        backup_mode = st.selectbox(
+            "Use Backup Fuel Source",
+            ["always", "auto", "off"],
+            index=0,
+            help="Always: combine both sources (recommended). Auto: use the tank level only when the fuel-consumed sensor is missing or flat over the selected days. Off: fuel-consumed sensor only."
+        )
         
         st.markdown("---")
         
@@ -2874,34 +3535,43 @@ def main():
         if st.button("📧 Email Report", width='stretch'):
             st.success("✅ Report sent to stakeholders")
     
-    # Process data with selected date range
-    with st.spinner("Processing enhanced analytics..."):
-        # Enhanced fuel analysis with real pricing
-        daily_fuel, fuel_stats, fuel_purchases, tank_validation = calculate_enhanced_fuel_analysis(
-            all_data.get('generator', pd.DataFrame()),
-            all_data.get('fuel_history', pd.DataFrame()),
-            all_data.get('fuel_purchases', pd.DataFrame()),
-            all_data.get('generator_detailed', pd.DataFrame()),
-            start_date, end_date
-        )
-        
-        # Enhanced solar analysis with 3-inverter system
-        daily_solar, solar_stats, hourly_solar, inverter_performance = process_enhanced_solar_analysis(
-            all_data.get('solar', pd.DataFrame()),
-            start_date, end_date
-        )
-    
-    # Enhanced tabs with Data Quality tab
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    # Section selector with Data Quality section
+    # Only the selected section is computed and rendered; st.tabs would run every tab body on each rerun
+    section_labels = [
         "🔋 Generator Fuel Analysis", 
         "☀️ Solar Performance", 
         "🏭 Factory Optimization",
         "📊 System Overview",
         "🩺 Data Quality"
-    ])
+    ]
+    active_section = st.radio("Dashboard section", section_labels, horizontal=True, key="active_section", label_visibility="collapsed")
+    show_fuel, show_solar, show_factory, show_overview, show_quality = (active_section == label for label in section_labels)
+    
+    # Process data with selected date range
+    if show_fuel or show_overview:
+        with st.spinner("Processing enhanced analytics..."):
+            # Enhanced fuel analysis with real pricing
+            daily_fuel, fuel_stats, fuel_purchases, tank_validation = calculate_enhanced_fuel_analysis(
+                all_data.get('generator_by_entity', {}).get('sensor.generator_fuel_consumed', all_data.get('generator', pd.DataFrame())),
+                all_data.get('fuel_history_by_entity', {}).get('sensor.generator_fuel_level', all_data.get('fuel_history', pd.DataFrame())),
+                all_data.get('fuel_purchases', pd.DataFrame()),
+                all_data.get('generator_detailed', pd.DataFrame()),
+                start_date, end_date,
+                pricing_mode=pricing_mode,
+                backup_mode=backup_mode
+            )
     
-    # Generator Analysis Tab (ENHANCED WITH REAL PRICING)
-    with tab1:
+    if show_overview:
+        with st.spinner("Processing enhanced analytics..."):
+            # Enhanced solar analysis with 3-inverter system
+            daily_solar, solar_stats, hourly_solar, inverter_performance = process_enhanced_solar_analysis(
+                all_data.get('solar', pd.DataFrame()),
+                start_date, end_date,
+                is_new_system=all_data.get('solar_is_new_system')
+            )
+    
+    # Generator Analysis Section (ENHANCED WITH REAL PRICING)
+    if show_fuel:
         st.header("🔋 Generator Fuel Analysis")
         st.markdown("**Real-time fuel consumption monitoring with actual market pricing**")
         
@@ -2964,11 +3634,11 @@ def main():
             with st.expander("⬇️ Download datasets", expanded=False):
                 c1, c2, c3 = st.columns(3)
                 with c1:
-                    st.download_button("Daily Fuel CSV", daily_fuel.to_csv(index=False).encode('utf-8'), file_name="daily_fuel.csv", mime="text/csv", key="dl_daily_fuel_top")
+                    st.download_button("Daily Fuel CSV", deferred_csv(daily_fuel), file_name="daily_fuel.csv", mime="text/csv", key="dl_daily_fuel_top")
                 with c2:
-                    st.download_button("Fuel Purchases CSV", fuel_purchases.to_csv(index=False).encode('utf-8') if not fuel_purchases.empty else b"", file_name="fuel_purchases.csv", mime="text/csv", key="dl_fuel_purchases_top", disabled=fuel_purchases.empty)
+                    st.download_button("Fuel Purchases CSV", deferred_csv(fuel_purchases) if not fuel_purchases.empty else b"", file_name="fuel_purchases.csv", mime="text/csv", key="dl_fuel_purchases_top", disabled=fuel_purchases.empty)
                 with c3:
-                    st.download_button("Runtime/Efficiency CSV", daily_fuel.to_csv(index=False).encode('utf-8'), file_name="fuel_runtime_efficiency.csv", mime="text/csv", key="dl_runtime_efficiency_top")
+                    st.download_button("Runtime/Efficiency CSV", deferred_csv(daily_fuel), file_name="fuel_runtime_efficiency.csv", mime="text/csv", key="dl_runtime_efficiency_top")
 
             # Add new analysis sections BEFORE charts
             st.markdown("---")
@@ -2999,31 +3669,11 @@ def main():
                 end_date
             )
             
-            st.markdown("---")
-            
             # Enhanced fuel analysis charts
-            st.markdown("### 📊 Fuel Usage Summary")
+            st.markdown("---\n\n### 📊 Fuel Usage Summary")
             st.caption("Here's what your generator used during this time period")
             
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                fig1, df1 = create_ultra_interactive_chart(
-                    daily_fuel, 'date', 'fuel_consumed_liters',
-                    'Daily Fuel Consumption (Enhanced)', '#3b82f6', 'bar',
-                    height=400, enable_zoom=True, enable_selection=True, selection_mode=selection_mode
-                )
-                if df1 is not None:
-                    st.download_button("⬇️ Download Chart Data (Fuel Consumption)", df1.to_csv(index=False).encode('utf-8'), file_name="fuel_consumption_chart.csv", mime="text/csv", key="dl_chart_fuel_consumption")
-            
-            with col2:
-                fig2, df2 = create_ultra_interactive_chart(
-                    daily_fuel, 'date', 'daily_cost_rands',
-                    'Daily Fuel Cost (Real Pricing)', '#ef4444', 'area',
-                    height=400, enable_zoom=True, enable_selection=True, selection_mode=selection_mode
-                )
-                if df2 is not None:
-                    st.download_button("⬇️ Download Chart Data (Fuel Cost)", df2.to_csv(index=False).encode('utf-8'), file_name="fuel_cost_chart.csv", mime="text/csv", key="dl_chart_fuel_cost")
+            render_fuel_usage_charts(daily_fuel)
             
             # Fuel purchase tracking comparison
             if not fuel_purchases.empty:
@@ -3033,55 +3683,24 @@ def main():
                 total_purchased = 0
                 total_consumed = fuel_stats.get('total_fuel_liters', 0)
                 
-                if 'quantity' in fuel_purchases.columns:
-                    total_purchased = fuel_purchases['quantity'].sum()
-                elif any('litre' in col for col in fuel_purchases.columns):
-                    litre_cols = [col for col in fuel_purchases.columns if 'litre' in col]
-                    total_purchased = fuel_purchases[litre_cols[0]].sum()
+                # Purchase columns are normalized at load, so quantities are always in 'litres'
+                has_litres = 'litres' in fuel_purchases.columns
+                if has_litres:
+                    total_purchased = fuel_purchases['litres'].sum()
                 
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    render_clean_metric(
-                        "Fuel Purchased",
-                        f"{total_purchased:,.0f} L",
-                        f"📦 Total bought",
-                        "cyan", "🛒",
-                        "Fuel procurement tracking"
-                    )
-                
-                with col2:
-                    render_clean_metric(
-                        "Fuel Consumed",
-                        f"{total_consumed:,.0f} L",
-                        f"⛽ Total used",
-                        "blue", "🔥",
-                        "Generator consumption"
-                    )
-                
-                with col3:
-                    balance = total_purchased - total_consumed
-                    render_clean_metric(
-                        "Fuel Balance",
-                        f"{balance:,.0f} L",
-                        "📊 Inventory status",
-                        "green" if balance > 0 else "red", "⚖️",
-                        "Surplus" if balance > 0 else "Deficit"
-                    )
+                balance = total_purchased - total_consumed
+                render_clean_metric_row([
+                    ("Fuel Purchased", f"{total_purchased:,.0f} L", "📦 Total bought", "cyan", "🛒", "Fuel procurement tracking"),
+                    ("Fuel Consumed", f"{total_consumed:,.0f} L", "⛽ Total used", "blue", "🔥", "Generator consumption"),
+                    ("Fuel Balance", f"{balance:,.0f} L", "📊 Inventory status", "green" if balance > 0 else "red", "⚖️",
+                     "Surplus" if balance > 0 else "Deficit")
+                ])
                 
                 # Purchase tracking charts (monthly aggregation)
                 if 'date' in fuel_purchases.columns:
-                    date_col = [col for col in fuel_purchases.columns if 'date' in col][0]
-                    qty_cols = [col for col in fuel_purchases.columns if 'litre' in col or 'quantity' in col]
                     price_col = 'price_per_litre' if 'price_per_litre' in fuel_purchases.columns else None
-                    if qty_cols:
-                        fp = fuel_purchases.copy()
-                        fp[date_col] = pd.to_datetime(fp[date_col], errors='coerce')
-                        fp = fp.dropna(subset=[date_col])
-                        fp['month'] = fp[date_col].dt.to_period('M').dt.to_timestamp()
-                        monthly = fp.groupby('month').agg({qty_cols[0]: 'sum', **({price_col: 'mean'} if price_col else {})}).reset_index()
-                        monthly.rename(columns={qty_cols[0]: 'litres'}, inplace=True)
-                        c1m, c2m = st.columns(2)
+                    if has_litres:
+                        monthly, monthly_cost_agg, comparison_df = monthly_fuel_tables(fuel_purchases, daily_fuel, price_col)
                         c1m, c2m, c3m = st.columns(3)
                         with c1m:
                             create_ultra_interactive_chart(
@@ -3099,10 +3718,6 @@ def main():
                                     )
                         # Monthly Generator Cost chart
                         if not daily_fuel.empty:
-                            monthly_cost = daily_fuel.copy()
-                            monthly_cost['month'] = monthly_cost['date'].dt.to_period('M').dt.to_timestamp()
-                            monthly_cost_agg = monthly_cost.groupby('month')['daily_cost_rands'].sum().reset_index()
-                            monthly_cost_agg.rename(columns={'daily_cost_rands': 'monthly_cost_rands'}, inplace=True)
                             with c3m:
                                 create_ultra_interactive_chart(
                                     monthly_cost_agg, 'month', 'monthly_cost_rands',
@@ -3113,65 +3728,13 @@ def main():
                         st.subheader("💡 Fuel Purchase vs Consumption Analysis")
                         
                         if not fuel_purchases.empty and not daily_fuel.empty:
-                            # Create comprehensive analysis
-                            analysis_data = []
-                            
-                            # Get purchase data by month
-                            fuel_purchases['month'] = pd.to_datetime(fuel_purchases['date']).dt.to_period('M').dt.to_timestamp()
-                            # Normalize fuel_purchases columns
-                            fuel_purchases_norm = normalize_purchase_columns(fuel_purchases)
-                            purchase_monthly = fuel_purchases_norm.groupby('month').agg({
-                                'litres': 'sum',
-                                'cost': 'sum'
-                            }).reset_index()
-                            purchase_monthly = purchase_monthly.rename(columns={'litres': 'purchased_litres', 'cost': 'purchase_cost'})
-                            purchase_monthly.rename(columns={'amount(liters)': 'purchased_litres', 'Cost(Rands)': 'purchase_cost'}, inplace=True)
-                            
-                            # Get consumption data by month
-                            consumption_monthly = daily_fuel.copy()
-                            consumption_monthly['month'] = consumption_monthly['date'].dt.to_period('M').dt.to_timestamp()
-                            consumed_monthly = consumption_monthly.groupby('month').agg({
-                                'fuel_consumed_liters': 'sum',
-                                'daily_cost_rands': 'sum'
-                            }).reset_index()
-                            consumed_monthly.rename(columns={'fuel_consumed_liters': 'consumed_litres', 'daily_cost_rands': 'consumption_cost'}, inplace=True)
-                            
-                            # Merge purchase and consumption data
-                            comparison_df = pd.merge(purchase_monthly, consumed_monthly, on='month', how='outer').fillna(0)
-                            comparison_df['net_fuel'] = comparison_df['purchased_litres'] - comparison_df['consumed_litres']
-                            comparison_df['utilization_rate'] = (comparison_df['consumed_litres'] / comparison_df['purchased_litres'] * 100).fillna(0)
-                            
                             # Display comparison charts
                             comp_col1, comp_col2 = st.columns(2)
                             
                             if not comparison_df.empty:
                                 with comp_col1:
                                     # Create dual-bar chart for purchased vs consumed
-                                    import plotly.graph_objects as go
-                                    
-                                    fig = go.Figure()
-                                    fig.add_trace(go.Bar(
-                                        x=comparison_df['month'],
-                                        y=comparison_df['purchased_litres'],
-                                        name='Purchased (L)',
-                                        marker_color='#10b981'
-                                    ))
-                                    fig.add_trace(go.Bar(
-                                        x=comparison_df['month'],
-                                        y=comparison_df['consumed_litres'],
-                                        name='Consumed (L)',
-                                        marker_color='#ef4444'
-                                    ))
-                                    
-                                    fig.update_layout(
-                                        title="Monthly Fuel: Purchased vs Consumed",
-                                        xaxis_title="Month",
-                                        yaxis_title="Litres",
-                                        barmode='group',
-                                        height=400
-                                    )
-                                    
-                                    st.plotly_chart(fig, width='stretch')
+                                    st.plotly_chart(build_purchase_vs_consumption_figure(comparison_df), width='stretch')
                                 
                                 with comp_col2:
                                     # Net fuel balance
@@ -3182,39 +3745,36 @@ def main():
                             
                             # Summary metrics
                             st.markdown("#### 📈 Purchase vs Consumption Summary")
-                            sum_col1, sum_col2, sum_col3, sum_col4 = st.columns(4)
                             
                             total_purchased = comparison_df['purchased_litres'].sum()
                             total_consumed = comparison_df['consumed_litres'].sum()
                             net_balance = total_purchased - total_consumed
                             overall_utilization = (total_consumed / total_purchased * 100) if total_purchased > 0 else 0
                             
-                            with sum_col1:
-                                render_clean_metric("Total Purchased", f"{total_purchased:.1f} L", f"From {len(fuel_purchases)} purchases", "green", "⛽")
-                            with sum_col2:
-                                render_clean_metric("Total Consumed", f"{total_consumed:.1f} L", f"Generator usage", "red", "🔥")
-                            with sum_col3:
-                                render_clean_metric("Net Balance", f"{net_balance:.1f} L", "Remaining/Deficit", "purple", "📊")
-                            with sum_col4:
-                                render_clean_metric("Utilization Rate", f"{overall_utilization:.1f}%", "Efficiency metric", "cyan", "⚡")
+                            render_clean_metric_row([
+                                ("Total Purchased", f"{total_purchased:.1f} L", f"From {len(fuel_purchases)} purchases", "green", "⛽"),
+                                ("Total Consumed", f"{total_consumed:.1f} L", "Generator usage", "red", "🔥"),
+                                ("Net Balance", f"{net_balance:.1f} L", "Remaining/Deficit", "purple", "📊"),
+                                ("Utilization Rate", f"{overall_utilization:.1f}%", "Efficiency metric", "cyan", "⚡")
+                            ])
                             
                             # Download comparison data
                             st.download_button(
                                 'Download Purchase vs Consumption Analysis',
-                                comparison_df.to_csv(index=False).encode('utf-8'),
+                                deferred_csv(comparison_df),
                                 file_name='fuel_purchase_consumption_analysis.csv',
                                 mime='text/csv',
                                 key='dl_comparison_analysis'
                             )
-                        st.download_button('Monthly Purchases CSV', monthly.to_csv(index=False).encode('utf-8'), file_name='fuel_purchases_monthly.csv', mime='text/csv', key='dl_monthly_purchases')
+                        st.download_button('Monthly Purchases CSV', deferred_csv(monthly), file_name='fuel_purchases_monthly.csv', mime='text/csv', key='dl_monthly_purchases')
                         if not daily_fuel.empty:
-                            st.download_button('Monthly Generator Cost CSV', monthly_cost_agg.to_csv(index=False).encode('utf-8'), file_name='monthly_generator_cost.csv', mime='text/csv', key='dl_monthly_generator_cost')
+                            st.download_button('Monthly Generator Cost CSV', deferred_csv(monthly_cost_agg), file_name='monthly_generator_cost.csv', mime='text/csv', key='dl_monthly_generator_cost')
         else:
             st.info("📊 No generator data available for selected period")
     
     # Solar Performance Analysis - SIMPLIFIED
-    # Solar Performance Tab - SIMPLE COMPARISON ONLY
-    with tab2:
+    # Solar Performance Section - SIMPLE COMPARISON ONLY
+    if show_solar:
         try:
             from simple_solar_comparison import render_simple_solar_comparison
             render_simple_solar_comparison()
@@ -3224,56 +3784,29 @@ def main():
             st.markdown("**Basic solar data display**")
             st.info("📊 No solar data available for selected period")
 
-    with tab3:
+    if show_factory:
         st.markdown("## 🏭 Factory Energy Optimization")
         st.info("📊 Factory energy analysis module ready for implementation")
     
-    # System Overview Tab
-    with tab4:
+    # System Overview Section
+    if show_overview:
         st.markdown("## 📊 Complete System Overview")
         
         # System health with FIXED DataFrame check
-        data_available = 0
-        if not daily_fuel.empty: data_available += 1
-        if not daily_solar.empty: data_available += 1
-        if not fuel_purchases.empty: data_available += 1
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            data_quality = (data_available / 3) * 100
-            render_clean_metric(
-                "System Health",
-                f"{data_quality:.0f}%",
-                "📊 Data coverage",
-                "green" if data_quality > 80 else "yellow", "🔧"
-            )
-        
-        with col2:
-            render_clean_metric(
-                "Active Systems",
-                f"{data_available}/3",
-                "⚡ Online modules",
-                "green", "📡"
-            )
-        
-        with col3:
-            total_cost = fuel_stats.get('total_cost_rands', 0)
-            solar_value = solar_stats.get('total_value_rands', 0)
-            render_clean_metric(
-                "Net Energy Cost",
-                f"R {total_cost - solar_value:,.0f}",
-                f"💰 After solar savings",
-                "blue", "💸"
-            )
-        
-        with col4:
-            render_clean_metric(
-                "Data Freshness",
-                "Live",
-                f"🕐 {datetime.now().strftime('%H:%M')}",
-                "green", "📊"
-            )
+        data_available = sum(not df.empty for df in (daily_fuel, daily_solar, fuel_purchases))
+        
+        data_quality = (data_available / 3) * 100
+        total_cost = fuel_stats.get('total_cost_rands', 0)
+        solar_value = solar_stats.get('total_value_rands', 0)
+        render_clean_metric_row([
+            ("System Health", f"{data_quality:.0f}%", "📊 Data coverage", "green" if data_quality > 80 else "yellow", "🔧"),
+            ("Active Systems", f"{data_available}/3", "⚡ Online modules", "green", "📡"),
+            ("Net Energy Cost", f"R {total_cost - solar_value:,.0f}", "💰 After solar savings", "blue", "💸"),
+            ("Data Freshness", "Live", f"🕐 {datetime.now().strftime('%H:%M')}", "green", "📊")
+        ])
+
+    if show_quality:
+        render_data_quality_dashboard()
 
 if __name__ == "__main__":
     main()
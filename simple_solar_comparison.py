@@ -11,6 +11,13 @@ import plotly.express as px
 from plotly.subplots import make_subplots
 import streamlit as st
 from datetime import datetime
+from functools import partial
+
+# Two inverter files, room for two versions of each; older versions are evicted after a re-download
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _read_solar_csv(file_path, mtime):
+    """Parse an inverter CSV once per file version; shared by reference, so callers must not mutate it."""
+    return pd.read_csv(file_path)
 
 def load_and_clean_data(file_path, system_label):
     """Load solar data and clean for visualization - Streamlit Cloud compatible."""
@@ -21,7 +28,8 @@ def load_and_clean_data(file_path, system_label):
             st.error(f"Data file not found: {file_path}")
             return pd.DataFrame()
             
-        df = pd.read_csv(file_path)
+        # The modification time is part of the cache key, so Data Manager downloads are picked up
+        df = _read_solar_csv(file_path, os.path.getmtime(file_path))
         
         # Validate required columns exist
         required_cols = ['entity_id', 'state', 'last_changed']
@@ -31,13 +39,16 @@ def load_and_clean_data(file_path, system_label):
             return pd.DataFrame()
         
         # Parse timestamps with explicit UTC handling for Streamlit Cloud
-        df['timestamp'] = pd.to_datetime(df['last_changed'], errors='coerce', utc=True)
+        timestamp = pd.to_datetime(df['last_changed'], errors='coerce', utc=True)
         
         # Convert to naive datetime to avoid timezone issues on Streamlit Cloud
-        if df['timestamp'].dt.tz is not None:
-            df['timestamp'] = df['timestamp'].dt.tz_convert(None)
+        if timestamp.dt.tz is not None:
+            timestamp = timestamp.dt.tz_convert(None)
         
-        df['power_kw'] = pd.to_numeric(df['state'], errors='coerce')
+        # assign builds a new frame; the cached CSV stays as read. A handful of inverter ids
+        # repeat across every reading, so they are grouped as categorical codes rather than strings
+        df = df.assign(timestamp=timestamp, power_kw=pd.to_numeric(df['state'], errors='coerce'),
+                       entity_id=df['entity_id'].astype('category'))
         
         # Remove invalid data
         df = df.dropna(subset=['timestamp', 'power_kw'])
@@ -56,29 +67,35 @@ def load_and_clean_data(file_path, system_label):
         st.code(traceback.format_exc())
         return pd.DataFrame()
 
+def _solar_signature(df):
+    """Cheap cache key for a cleaned solar frame: length, first/last timestamp and total power."""
+    if df.empty:
+        return (0, tuple(df.columns))
+    return (len(df), tuple(df.columns), df['timestamp'].iloc[0], df['timestamp'].iloc[-1], float(df['power_kw'].sum()))
+
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs={pd.DataFrame: _solar_signature})
 def aggregate_daily_data(df):
     """Aggregate to daily totals and peaks."""
     if df.empty:
         return pd.DataFrame()
     
-    df['date'] = df['timestamp'].dt.date
-    
     # Proper solar data aggregation methodology - Streamlit Cloud compatible
+    # (assign keeps the caller's frame untouched, so cache hits and misses look the same)
     try:
-        df['hour'] = df['timestamp'].dt.floor('h') 
-        df['date'] = df['timestamp'].dt.date
+        df = df.assign(hour=df['timestamp'].dt.floor('h'))
     except Exception as e:
         st.error(f"Error processing timestamps in aggregation: {e}")
         return pd.DataFrame()
     
     # CORRECTED: Get realistic individual inverter averages first, then sum per hour
     # Step 1: Average each inverter's power readings per hour  
-    hourly_inverter_avg = df.groupby(['hour', 'system', 'entity_id']).agg({
+    # (observed=True: entity_id is categorical, and unobserved hour/inverter pairs must not count as active)
+    hourly_inverter_avg = df.groupby(['hour', 'system', 'entity_id'], observed=True).agg({
         'power_kw': 'mean'  # Average power per inverter per hour
     }).reset_index()
     
     # Step 2: Sum all inverters to get total system power per hour
-    hourly_system = hourly_inverter_avg.groupby(['hour', 'system']).agg({
+    hourly_system = hourly_inverter_avg.groupby(['hour', 'system'], observed=True).agg({
         'power_kw': 'sum',  # Total system power = sum of individual inverter averages
         'entity_id': 'nunique'  # Number of active inverters
     }).reset_index()
@@ -108,6 +125,67 @@ def aggregate_daily_data(df):
     
     return daily
 
+def _daily_signature(df):
+    """Cheap cache key for combined daily rows: length, date span and energy/peak totals."""
+    if df.empty:
+        return (0, tuple(df.columns))
+    return (len(df), tuple(df.columns), df['date'].iloc[0], df['date'].iloc[-1],
+            float(df['total_kwh'].sum()), float(df['peak_kw'].sum()))
+
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs={pd.DataFrame: _daily_signature})
+def _timeline_figure(combined, y_col, title, y_label):
+    """Old vs new daily line chart with the system change marker."""
+    fig = px.line(
+        combined, 
+        x='date_str', 
+        y=y_col,
+        color='system',
+        title=title,
+        labels={y_col: y_label, 'date_str': 'Date'}
+    )
+    
+    # Add system change marker with error handling
+    try:
+        fig.add_vline(x="2025-11-01", line_dash="dash", annotation_text="System Change")
+    except Exception:
+        # Fallback: add as vertical shape
+        fig.add_shape(type="line", x0="2025-11-01", x1="2025-11-01", y0=0, y1=1, yref="paper", 
+                      line=dict(color="orange", dash="dash"))
+    return fig
+
+@st.cache_data(ttl=600, show_spinner=False, hash_funcs={pd.DataFrame: _daily_signature})
+def _distribution_figure(combined):
+    """Side-by-side energy and peak power box plots per system."""
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=['Energy Distribution', 'Peak Power Distribution']
+    )
+    
+    for system in combined['system'].unique():
+        system_data = combined[combined['system'] == system]
+        
+        fig.add_trace(
+            go.Box(y=system_data['total_kwh'], name=f'{system} Energy', boxpoints='outliers'),
+            row=1, col=1
+        )
+        
+        fig.add_trace(
+            go.Box(y=system_data['peak_kw'], name=f'{system} Peak Power', boxpoints='outliers'),
+            row=1, col=2
+        )
+    
+    fig.update_layout(title_text="Performance Distribution Comparison", height=400)
+    return fig
+
+def summary_statistics(daily):
+    """Mean, median, max, min and std of daily energy and peak power, in one aggregation pass."""
+    stats = daily[['total_kwh', 'peak_kw']].agg(['mean', 'median', 'max', 'min', 'std'])
+    return pd.DataFrame({
+        'Metric': ['Mean', 'Median', 'Max', 'Min', 'Std Dev'],
+        'Energy (kWh)': stats['total_kwh'].to_numpy(),
+        'Peak Power (kW)': stats['peak_kw'].to_numpy()
+    })
+
 def create_comparison_charts(old_data, new_data):
     """Create visualization charts for comparison - Streamlit Cloud compatible."""
     
@@ -138,23 +216,8 @@ def create_comparison_charts(old_data, new_data):
         # Ensure date column is properly formatted for Plotly
         combined['date_str'] = combined['date'].astype(str)
         
-        fig1 = px.line(
-            combined, 
-            x='date_str', 
-            y='total_kwh',
-            color='system',
-            title='Daily Energy Generation - Old vs New System',
-            labels={'total_kwh': 'Daily Energy (kWh)', 'date_str': 'Date'}
-        )
-        
-        # Add system change marker with error handling
-        try:
-            fig1.add_vline(x="2025-11-01", line_dash="dash", annotation_text="System Change")
-        except Exception:
-            # Fallback: add as vertical shape
-            fig1.add_shape(type="line", x0="2025-11-01", x1="2025-11-01", y0=0, y1=1, yref="paper", 
-                          line=dict(color="orange", dash="dash"))
-        
+        # Figures are cached per data signature, so reruns skip rebuilding the Plotly traces
+        fig1 = _timeline_figure(combined, 'total_kwh', 'Daily Energy Generation - Old vs New System', 'Daily Energy (kWh)')
         st.plotly_chart(fig1, use_container_width=True)
         
     except Exception as e:
@@ -165,22 +228,7 @@ def create_comparison_charts(old_data, new_data):
     
     # Chart 2: Daily Peak Power Timeline
     try:
-        fig2 = px.line(
-            combined, 
-            x='date_str', 
-            y='peak_kw',
-            color='system',
-            title='Daily Peak Power - Old vs New System',
-            labels={'peak_kw': 'Peak Power (kW)', 'date_str': 'Date'}
-        )
-        
-        try:
-            fig2.add_vline(x="2025-11-01", line_dash="dash", annotation_text="System Change")
-        except Exception:
-            # Fallback: add as vertical shape  
-            fig2.add_shape(type="line", x0="2025-11-01", x1="2025-11-01", y0=0, y1=1, yref="paper",
-                          line=dict(color="orange", dash="dash"))
-        
+        fig2 = _timeline_figure(combined, 'peak_kw', 'Daily Peak Power - Old vs New System', 'Peak Power (kW)')
         st.plotly_chart(fig2, use_container_width=True)
         
     except Exception as e:
@@ -190,25 +238,7 @@ def create_comparison_charts(old_data, new_data):
     
     # Chart 3: Box Plot Comparison
     try:
-        fig3 = make_subplots(
-            rows=1, cols=2,
-            subplot_titles=['Energy Distribution', 'Peak Power Distribution']
-        )
-        
-        for system in combined['system'].unique():
-            system_data = combined[combined['system'] == system]
-            
-            fig3.add_trace(
-                go.Box(y=system_data['total_kwh'], name=f'{system} Energy', boxpoints='outliers'),
-                row=1, col=1
-            )
-            
-            fig3.add_trace(
-                go.Box(y=system_data['peak_kw'], name=f'{system} Peak Power', boxpoints='outliers'),
-                row=1, col=2
-            )
-        
-        fig3.update_layout(title_text="Performance Distribution Comparison", height=400)
+        fig3 = _distribution_figure(combined)
         st.plotly_chart(fig3, use_container_width=True)
         
     except Exception as e:
@@ -293,15 +323,18 @@ def render_simple_solar_comparison():
     # Process and visualize
     if not old_raw.empty or not new_raw.empty:
         
-        st.markdown("---")
-        st.markdown("### Data Processing")
+        st.markdown("---\n\n### Data Processing")
         
         old_daily = aggregate_daily_data(old_raw)
         new_daily = aggregate_daily_data(new_raw)
         
+        # Nothing survived aggregation: skip the metric, chart and export sections entirely
+        if old_daily.empty and new_daily.empty:
+            st.info("📊 No daily solar data to compare - use the Data Manager to fetch the inverter files.")
+            return
+        
         # Enhanced Key Performance Metrics
-        st.markdown("---")
-        st.markdown("### 🎯 Key Performance Metrics")
+        st.markdown("---\n\n### 🎯 Key Performance Metrics")
         
         if not old_daily.empty and not new_daily.empty:
             # Calculate improvements
@@ -353,8 +386,9 @@ def render_simple_solar_comparison():
                 st.caption(f"Old: {old_avg_energy:.1f} kWh")
             
             with col4:
-                old_active_pct = (len(old_raw[old_raw['power_kw'] > 1.0]) / len(old_raw) * 100)
-                new_active_pct = (len(new_raw[new_raw['power_kw'] > 1.0]) / len(new_raw) * 100)
+                # Share of readings above 1 kW, from the boolean mask alone rather than a filtered copy
+                old_active_pct = (old_raw['power_kw'].to_numpy() > 1.0).mean() * 100
+                new_active_pct = (new_raw['power_kw'].to_numpy() > 1.0).mean() * 100
                 active_improvement = new_active_pct - old_active_pct
                 
                 st.metric(
@@ -366,8 +400,7 @@ def render_simple_solar_comparison():
                 st.caption(f"Old: {old_active_pct:.1f}%")
         
         # System Configuration Comparison
-        st.markdown("---")
-        st.markdown("### 🔧 System Configuration")
+        st.markdown("---\n\n### 🔧 System Configuration")
         
         col1, col2 = st.columns(2)
         
@@ -393,8 +426,7 @@ def render_simple_solar_comparison():
             st.write(f"📊 Data Quality: 100.0%")
             st.write(f"⚡ Active Generation: {new_active_pct:.1f}%")
         
-        st.markdown("---")
-        st.markdown("### 📊 Visual Comparison")
+        st.markdown("---\n\n### 📊 Visual Comparison")
         
         # Add performance summary chart first
         if not old_daily.empty and not new_daily.empty:
@@ -466,57 +498,23 @@ def render_simple_solar_comparison():
         create_comparison_charts(old_daily, new_daily)
         
         # Add statistical insights
-        st.markdown("---")
-        st.markdown("### 📈 Statistical Insights")
+        st.markdown("---\n\n### 📈 Statistical Insights")
         
         if not old_daily.empty and not new_daily.empty:
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown("**🔴 Old System Statistics**")
-                old_stats = pd.DataFrame({
-                    'Metric': ['Mean', 'Median', 'Max', 'Min', 'Std Dev'],
-                    'Energy (kWh)': [
-                        old_daily['total_kwh'].mean(),
-                        old_daily['total_kwh'].median(),
-                        old_daily['total_kwh'].max(),
-                        old_daily['total_kwh'].min(),
-                        old_daily['total_kwh'].std()
-                    ],
-                    'Peak Power (kW)': [
-                        old_daily['peak_kw'].mean(),
-                        old_daily['peak_kw'].median(),
-                        old_daily['peak_kw'].max(),
-                        old_daily['peak_kw'].min(),
-                        old_daily['peak_kw'].std()
-                    ]
-                })
+                old_stats = summary_statistics(old_daily)
                 st.dataframe(old_stats.round(1), use_container_width=True, hide_index=True)
             
             with col2:
                 st.markdown("**🟢 New System Statistics**")
-                new_stats = pd.DataFrame({
-                    'Metric': ['Mean', 'Median', 'Max', 'Min', 'Std Dev'],
-                    'Energy (kWh)': [
-                        new_daily['total_kwh'].mean(),
-                        new_daily['total_kwh'].median(),
-                        new_daily['total_kwh'].max(),
-                        new_daily['total_kwh'].min(),
-                        new_daily['total_kwh'].std()
-                    ],
-                    'Peak Power (kW)': [
-                        new_daily['peak_kw'].mean(),
-                        new_daily['peak_kw'].median(),
-                        new_daily['peak_kw'].max(),
-                        new_daily['peak_kw'].min(),
-                        new_daily['peak_kw'].std()
-                    ]
-                })
+                new_stats = summary_statistics(new_daily)
                 st.dataframe(new_stats.round(1), use_container_width=True, hide_index=True)
         
         # Key Findings Summary
-        st.markdown("---")
-        st.markdown("### 🎯 Key Findings Summary")
+        st.markdown("---\n\n### 🎯 Key Findings Summary")
         
         if not old_daily.empty and not new_daily.empty:
             findings_col1, findings_col2 = st.columns(2)
@@ -549,15 +547,15 @@ def render_simple_solar_comparison():
                     st.warning(f"⚠ Peak power: {new_max_peak:.1f} kW vs {old_max_peak:.1f} kW ({peak_diff:.1f}%)")
         
         # Raw data download
-        st.markdown("---")
-        st.markdown("### 📥 Export Data for Your Analysis")
+        st.markdown("---\n\n### 📥 Export Data for Your Analysis")
+        # Payloads are callables, so the CSVs are only written when a button is clicked
         col1, col2 = st.columns(2)
         
         with col1:
             if not old_daily.empty:
                 st.download_button(
                     "Download Old System Data",
-                    old_daily.to_csv(index=False),
+                    partial(old_daily.to_csv, index=False),
                     "old_system_daily.csv",
                     "text/csv"
                 )
@@ -566,7 +564,7 @@ def render_simple_solar_comparison():
             if not new_daily.empty:
                 st.download_button(
                     "Download New System Data", 
-                    new_daily.to_csv(index=False),
+                    partial(new_daily.to_csv, index=False),
                     "new_system_daily.csv",
                     "text/csv"
                 )
\ No newline at end of file
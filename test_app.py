@@ -0,0 +1,403 @@
+"""
+Regression tests for app.py helpers
+Run: python -m pytest -q test_app.py
+"""
+import io
+from datetime import date
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import simple_solar_comparison
+
+
+def _ha_export(entity_id, stamps, states):
+    return pd.DataFrame({
+        'entity_id': pd.Categorical([entity_id] * len(stamps)),
+        'state': np.asarray(states, dtype=np.float64),
+        'last_changed': pd.DatetimeIndex(stamps, tz='UTC'),
+    })
+
+
+@pytest.fixture(scope="module")
+def fuel_frames():
+    """Three days of tank readings every 10 minutes, burning 2 L per reading during working hours"""
+    stamps = pd.date_range('2025-03-01', '2025-03-03 23:50', freq='10min')
+    burning = (stamps.hour >= 8) & (stamps.hour < 17)
+    level = 400 - 2.0 * np.cumsum(burning)
+    tank = _ha_export('sensor.generator_fuel_level', stamps.append(pd.DatetimeIndex(['2025-03-10 12:00'])),
+                      np.r_[level, level[-1]])
+    hourly = stamps[::6]
+    generator = _ha_export('sensor.generator_fuel_consumed', hourly, level[::6])
+    purchases = pd.DataFrame({
+        'date': pd.to_datetime(['2025-02-25', '2025-03-02']),
+        'litres': [500.0, 300.0],
+        'cost': [10_000.0, 6_300.0],
+        'price_per_litre': [20.0, 21.0],
+    })
+    return generator, tank, purchases
+
+
+def _fuel_totals(frames, start_date, end_date, backup_mode):
+    generator, tank, purchases = frames
+    _, stats, _, _ = app.calculate_enhanced_fuel_analysis(
+        generator, tank, purchases, pd.DataFrame(), start_date, end_date, backup_mode=backup_mode,
+    )
+    return stats.get('total_fuel_liters', 0), stats.get('total_cost_rands', 0)
+
+
+def test_auto_backup_mode_uses_the_fuel_consumed_sensor_when_it_reports(fuel_frames):
+    start_date, end_date = date(2025, 3, 1), date(2025, 3, 3)
+    auto = _fuel_totals(fuel_frames, start_date, end_date, "auto")
+    assert auto == pytest.approx(_fuel_totals(fuel_frames, start_date, end_date, "off"))
+    assert auto[0] > 0
+
+
+@pytest.mark.parametrize("generator_state", [None, 400.0])  # sensor missing, sensor flat
+def test_auto_backup_mode_falls_back_to_tank_level(fuel_frames, generator_state):
+    generator, tank, purchases = fuel_frames
+    if generator_state is None:
+        generator = generator.iloc[0:0]
+    else:
+        generator = generator.assign(state=generator_state)
+    frames = (generator, tank, purchases)
+    start_date, end_date = date(2025, 3, 1), date(2025, 3, 3)
+    auto = _fuel_totals(frames, start_date, end_date, "auto")
+    assert _fuel_totals(frames, start_date, end_date, "off")[0] == 0
+    assert auto[0] > 0
+    assert auto == pytest.approx(_fuel_totals(frames, start_date, end_date, "always"))
+
+
+def test_fuel_analysis_prices_each_day_from_the_latest_purchase(fuel_frames):
+    generator, tank, purchases = fuel_frames
+    daily, stats, _, _ = app.calculate_enhanced_fuel_analysis(
+        generator, tank, purchases, pd.DataFrame(), date(2025, 3, 1), date(2025, 3, 3),
+    )
+    assert daily['date'].dt.day.tolist() == [1, 2, 3]
+    assert daily['fuel_price_per_liter'].tolist() == [20.0, 21.0, 21.0]
+    assert (daily['fuel_consumed_liters'] > 0).all()
+    assert stats['total_cost_rands'] == pytest.approx((daily['fuel_consumed_liters'] * daily['fuel_price_per_liter']).sum())
+
+
+def test_csv_export_format_does_not_depend_on_size():
+    rows = 60_000
+    df = pd.DataFrame({
+        'date': pd.date_range('2025-01-01', periods=rows, freq='min'),
+        'litres': [50.0, 12.5] * (rows // 2),
+        'count': range(rows),
+        'source': pd.Categorical(['gen', 'tank'] * (rows // 2)),
+    })
+    small, large = app.csv_bytes(df.head(10)), app.csv_bytes(df)
+    assert large.startswith(small)
+    assert large == df.to_csv(index=False).encode('utf-8')
+
+
+def _ns(*stamps):
+    return pd.to_datetime(list(stamps)).as_unit('ns').asi8
+
+
+def test_hold_hours_uses_gap_to_next_reading_of_same_series():
+    ts = _ns('2025-05-01 10:00', '2025-05-01 10:15', '2025-05-01 10:45')
+    hold = app._hold_hours(ts, np.array([0, 0, 0]))
+    assert hold == pytest.approx([0.25, 0.5, 0.5])
+
+
+def test_hold_hours_caps_gaps_longer_than_max_hold():
+    ts = _ns('2025-05-01 06:00', '2025-05-01 09:00', '2025-05-01 09:30')
+    hold = app._hold_hours(ts, np.array([0, 0, 0]))
+    assert hold == pytest.approx([app.MAX_HOLD_HOURS, 0.5, 0.5])
+
+
+def test_hold_hours_does_not_span_series_boundaries():
+    # Interleaved inverters: each reading holds until the next reading of its own inverter
+    ts = _ns('2025-05-01 10:00', '2025-05-01 10:05', '2025-05-01 10:20', '2025-05-01 10:30', '2025-05-01 10:35')
+    codes = np.array([0, 1, 0, 1, 2])
+    hold = app._hold_hours(ts, codes)
+    # Trailing readings repeat their series' previous gap; a lone reading holds for nothing
+    assert hold == pytest.approx([1 / 3, 5 / 12, 1 / 3, 5 / 12, 0.0])
+
+
+def test_hold_hours_does_not_depend_on_row_order():
+    ts = _ns('2025-05-01 10:45', '2025-05-01 10:00', '2025-05-01 10:15')
+    hold = app._hold_hours(ts, np.array([0, 0, 0]))
+    assert hold == pytest.approx([0.5, 0.25, 0.5])
+
+
+def test_hold_hours_empty_input():
+    assert len(app._hold_hours(np.array([], dtype=np.int64), np.array([], dtype=np.int64))) == 0
+
+
+def test_grouped_stats_matches_pandas_groupby():
+    rng = np.random.default_rng(0)
+    codes = rng.choice([0, 3, 4, 9], size=500)  # gaps in the code range must not appear in the output
+    values = rng.random(500).astype(np.float32)
+    weights = rng.random(500)
+    keys, counts, sums, maxes = app._grouped_stats(codes, values, sums_of=weights)
+    expected = pd.DataFrame({'code': codes, 'value': values, 'weight': weights}).groupby('code').agg(
+        count=('value', 'size'), total=('weight', 'sum'), peak=('value', 'max'))
+    assert keys.tolist() == expected.index.tolist()
+    assert counts.tolist() == expected['count'].tolist()
+    assert sums == pytest.approx(expected['total'].to_numpy())
+    assert maxes == pytest.approx(expected['peak'].to_numpy())
+
+
+def test_grouped_stats_empty_input():
+    keys, counts, sums, maxes = app._grouped_stats(np.array([], dtype=np.int64), np.array([]))
+    assert len(keys) == len(counts) == len(sums) == len(maxes) == 0
+
+
+def _write_ha_export(path):
+    pd.DataFrame({
+        'entity_id': ['sensor.generator_fuel_level'] * 3,
+        'state': [59.4, 58.1, 'unavailable'],
+        'last_changed': ['2025-05-01T10:00:00Z', '2025-05-01T11:00:00Z', '2025-05-01T12:00:00Z'],
+    }).to_csv(path, index=False)
+
+
+def test_read_csv_typed_parses_last_changed_as_datetime(tmp_path):
+    path = tmp_path / 'history.csv'
+    path.write_text(
+        "entity_id,state,last_changed\n"
+        "sensor.generator_fuel_level,59.4,2025-03-01T08:10:00.000Z\n"
+        "sensor.generator_fuel_level,unavailable,2025-03-01T08:00:00.000Z\n"
+    )
+    df = app._read_csv_typed(path, app.HA_EXPORT_SCHEMA)
+    assert pd.api.types.is_datetime64_any_dtype(df['last_changed'])
+    assert df['last_changed'].is_monotonic_increasing
+    assert df['state'].dtype == np.float64
+    assert df['state'].isna().tolist() == [True, False]
+
+
+def test_read_source_caches_outside_the_data_directory(tmp_path, monkeypatch):
+    data_dir, cache_dir = tmp_path / 'data', tmp_path / 'cache'
+    data_dir.mkdir()
+    monkeypatch.setattr(app, 'CACHE_DIR', cache_dir)
+    source = data_dir / 'history.csv'
+    _write_ha_export(source)
+
+    first = app._read_source(str(source), source.stat().st_mtime, app.HA_EXPORT_SCHEMA)
+    assert [p.name for p in data_dir.iterdir()] == ['history.csv']
+    assert len(list(cache_dir.glob('history.csv.*.parquet'))) == 1
+
+    again = app._read_source(str(source), source.stat().st_mtime, app.HA_EXPORT_SCHEMA)
+    # Parquet has no second resolution, so only the timestamp unit may differ on the cached read
+    pd.testing.assert_frame_equal(first, again.astype({'last_changed': first['last_changed'].dtype}))
+
+
+def test_read_source_reports_unwritable_cache(tmp_path, monkeypatch, capsys):
+    blocker = tmp_path / 'not-a-dir'
+    blocker.write_text('')
+    monkeypatch.setattr(app, 'CACHE_DIR', blocker / 'cache')
+    source = tmp_path / 'history.csv'
+    _write_ha_export(source)
+
+    df = app._read_source(str(source), source.stat().st_mtime, app.HA_EXPORT_SCHEMA)
+    assert df['state'].tolist()[:2] == [59.4, 58.1]
+    assert 'Could not write cache' in capsys.readouterr().out
+
+
+class _FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code, self.headers = status_code, headers or {}
+        self.raw = io.BytesIO(body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_remote_copy_and_etag_live_in_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'CACHE_DIR', tmp_path)
+    url = 'https://example.invalid/New_inverter.csv'
+    body = b'entity_id,state,last_changed\nsensor.inverter_power,1.5,2025-05-01T10:00:00Z\n'
+    sent = []
+
+    def fake_get(_url, headers=None, **_):
+        sent.append(headers)
+        return _FakeResponse(304) if headers else _FakeResponse(200, body, {'ETag': '"v1"'})
+
+    monkeypatch.setattr(app._HTTP, 'get', fake_get)
+    cache = app._cache_path(url)
+    first = app._fetch_remote_csv(url, str(cache), schema=app.HA_EXPORT_SCHEMA)
+    assert cache.parent == tmp_path and cache.exists()
+    assert cache.with_name(f"{cache.name}.etag").read_text() == '"v1"'
+
+    # A stale copy is revalidated and served from disk on 304
+    again = app._fetch_remote_csv(url, str(cache), max_age_hours=0, schema=app.HA_EXPORT_SCHEMA)
+    assert sent[-1] == {'If-None-Match': '"v1"'}
+    assert again['state'].tolist() == first['state'].tolist() == [1.5]
+
+
+@pytest.fixture
+def fake_st(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(app, 'st', SimpleNamespace(session_state={}, html=emitted.append))
+    return emitted
+
+
+def test_component_css_is_emitted_once_per_full_run(fake_st, monkeypatch):
+    monkeypatch.setattr(app, 'get_script_run_ctx', lambda: SimpleNamespace(fragment_ids_this_run=None))
+    app.use_component_css('status_badge')
+    app.use_component_css('status_badge')
+    assert fake_st == [app.COMPONENT_CSS['status_badge']]
+
+
+def test_component_css_is_re_emitted_on_fragment_reruns(fake_st, monkeypatch):
+    app.st.session_state['_css_status_badge'] = True  # set by the preceding full run
+    monkeypatch.setattr(app, 'get_script_run_ctx', lambda: SimpleNamespace(fragment_ids_this_run=['frag']))
+    app.use_component_css('status_badge')
+    assert fake_st == [app.COMPONENT_CSS['status_badge']]
+
+
+def test_daily_price_nearest_prior_uses_latest_purchase_on_or_before_each_date():
+    purchases = pd.DataFrame({'date': pd.to_datetime(['2025-01-05', '2025-01-20']), 'price_per_litre': [20.0, 22.0]})
+    dates = pd.Index(pd.date_range('2025-01-01', '2025-01-25').date)
+    prices = app.build_daily_price_series(purchases, dates, "nearest_prior")
+    assert prices.index.equals(dates)
+    assert prices[date(2025, 1, 4)] == 21.0  # before the first purchase: overall mean
+    assert prices[date(2025, 1, 5)] == prices[date(2025, 1, 19)] == 20.0
+    assert prices[date(2025, 1, 20)] == prices[date(2025, 1, 25)] == 22.0
+
+
+def test_daily_price_monthly_average_falls_back_to_mean_for_months_without_purchases():
+    purchases = pd.DataFrame({'date': pd.to_datetime(['2025-01-05', '2025-01-20', '2025-03-01']),
+                              'price_per_litre': [20.0, 22.0, 24.0]})
+    dates = pd.Index([date(2025, 1, 31), date(2025, 2, 15), date(2025, 3, 2)])
+    prices = app.build_daily_price_series(purchases, dates, "monthly_average")
+    assert prices.tolist() == [21.0, 22.0, 24.0]
+
+
+def test_daily_price_without_purchases_or_prices():
+    dates = pd.Index([date(2025, 1, 1)])
+    assert app.build_daily_price_series(pd.DataFrame(), dates).empty
+    assert app.build_daily_price_series(pd.DataFrame({'date': [pd.Timestamp('2025-01-01')]}), dates).tolist() == [22.50]
+
+
+@pytest.fixture
+def sorted_readings():
+    stamps = pd.DatetimeIndex(['2025-03-01 00:00', '2025-03-01 23:59', '2025-03-02 00:00',
+                               '2025-03-02 12:00', '2025-03-03 00:00'], tz='UTC')
+    return pd.DataFrame({'last_changed': stamps, 'state': np.arange(5.0)})
+
+
+def test_date_slice_bounds_are_start_of_day_to_next_midnight(sorted_readings):
+    col = sorted_readings['last_changed']
+    assert app._date_slice_bounds(col, date(2025, 3, 1), date(2025, 3, 1)) == (0, 2)
+    assert app._date_slice_bounds(col, date(2025, 3, 2), date(2025, 3, 3)) == (2, 5)
+    assert app._date_slice_bounds(col, date(2025, 4, 1), date(2025, 4, 30)) == (5, 5)
+
+
+def test_slice_sorted_by_date_handles_unsorted_input(sorted_readings):
+    expected = sorted_readings.iloc[2:4]
+    pd.testing.assert_frame_equal(app.slice_sorted_by_date(sorted_readings, 'last_changed', date(2025, 3, 2), date(2025, 3, 2)), expected)
+    shuffled = sorted_readings.iloc[[3, 0, 4, 2, 1]]
+    pd.testing.assert_frame_equal(app.slice_sorted_by_date(shuffled, 'last_changed', date(2025, 3, 2), date(2025, 3, 2)), expected)
+
+
+def test_m4_aggregate_keeps_extremes_and_endpoints():
+    rng = np.random.default_rng(1)
+    n = 20_000
+    df = pd.DataFrame({'t': pd.date_range('2025-01-01', periods=n, freq='min'), 'v': rng.normal(size=n)})
+    df.loc[5_000, 'v'], df.loc[15_000, 'v'] = 100.0, -100.0
+    df.loc[7, 'v'] = np.nan
+
+    out = app.m4_aggregate(df, 't', 'v', width_px=500)
+    assert len(out) <= 4 * 500
+    assert out['t'].is_monotonic_increasing
+    assert out['v'].notna().all()
+    assert {0, 5_000, 15_000, n - 1} <= set(out.index)
+
+
+def test_m4_aggregate_leaves_small_frames_alone():
+    df = pd.DataFrame({'t': pd.date_range('2025-01-01', periods=100, freq='min'), 'v': np.arange(100.0)})
+    assert app.m4_aggregate(df, 't', 'v', width_px=500) is df
+
+
+def test_monthly_fuel_tables():
+    purchases = pd.DataFrame({
+        'date': pd.to_datetime(['2025-01-03', '2025-01-20', '2025-02-10']),
+        'litres': [100.0, 50.0, 200.0],
+        'cost': [2_000.0, 1_100.0, 4_200.0],
+        'price_per_litre': [20.0, 22.0, 21.0],
+    })
+    daily = pd.DataFrame({
+        'date': pd.to_datetime(['2025-01-05', '2025-01-06', '2025-03-01']),
+        'fuel_consumed_liters': [30.0, 45.0, 10.0],
+        'daily_cost_rands': [600.0, 900.0, 210.0],
+    })
+    monthly, cost, comparison = app.monthly_fuel_tables(purchases, daily, 'price_per_litre')
+
+    assert monthly['month'].dt.month.tolist() == [1, 2]
+    assert monthly['litres'].tolist() == [150.0, 200.0]
+    assert monthly['price_per_litre'].tolist() == [21.0, 21.0]
+    assert cost['monthly_cost_rands'].tolist() == [1_500.0, 210.0]
+    assert comparison['month'].dt.month.tolist() == [1, 2, 3]
+    assert comparison['net_fuel'].tolist() == [75.0, 200.0, -10.0]
+    assert comparison['utilization_rate'].tolist() == [50.0, 0.0, 0.0]
+    # The tables are shown and exported as CSV, so values must print as entered
+    exported, _, _ = app.monthly_fuel_tables(purchases.assign(litres=[59.4, 0.0, 0.0]), daily)
+    assert exported.to_csv(index=False).splitlines()[1] == '2025-01-01,59.4'
+
+    _, no_cost, no_comparison = app.monthly_fuel_tables(purchases, pd.DataFrame())
+    assert no_cost.empty and no_comparison.empty
+
+
+def test_minify_css_drops_comments_and_whitespace_but_keeps_selectors():
+    css = """
+        <style>
+            /* header */
+            .a  .b > p ,  h1 {
+                color : red ;
+                background: url('x.png');
+            }
+        </style>
+    """
+    assert app._minify_css(css) == "<style>.a .b>p,h1{color :red;background:url('x.png')}</style>"
+
+
+def test_read_xlsx_fast_trims_trailing_empty_columns_and_rows(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.append(['Date', 'Amount (liters)', None])
+    sheet.append([pd.Timestamp('2025-01-03').to_pydatetime(), 100, None])
+    sheet.append([pd.Timestamp('2025-01-20').to_pydatetime(), 50.5, None])
+    sheet.append([None, None, None])
+    path = tmp_path / 'fuel.xlsx'
+    wb.save(path)
+
+    df = app._read_xlsx_fast(path)
+    assert df.columns.tolist() == ['Date', 'Amount (liters)']
+    assert df['Amount (liters)'].tolist() == [100, 50.5]
+    assert pd.to_datetime(df['Date']).dt.day.tolist() == [3, 20]
+
+
+def test_aggregate_daily_data_counts_only_inverters_reporting_in_each_hour():
+    # Inverter B misses the 11:00 hour, so that hour has one active inverter
+    stamps = pd.to_datetime(['2025-05-01 10:00', '2025-05-01 10:00', '2025-05-01 11:00', '2025-05-01 12:00', '2025-05-01 12:00'])
+    readings = pd.DataFrame({
+        'timestamp': stamps,
+        'entity_id': pd.Categorical(['A', 'B', 'A', 'A', 'B']),
+        'power_kw': [2.0, 4.0, 3.0, 1.0, 1.0],
+        'system': 'Old System',
+    })
+    daily = simple_solar_comparison.aggregate_daily_data(readings)
+    assert len(daily) == 1
+    # Hourly counts 2, 1, 2 average to 5/3; counting B in 11:00 would give 2
+    assert daily['avg_inverters'].iloc[0] == pytest.approx(5 / 3)
+    assert daily['avg_system_kw'].iloc[0] == pytest.approx((6.0 + 3.0 + 2.0) / 3)
+
+
+def test_solar_analysis_reports_peaks_as_read():
+    stamps = pd.date_range('2025-11-07 08:00', periods=6, freq='15min', tz='UTC')
+    solar = _ha_export('sensor.goodwegt1_active_power', stamps, [10.0, 30.0, 59.4, 88.4, 17.8, 5.0])
+    daily, stats, hourly, inverters = app.process_enhanced_solar_analysis(solar, date(2025, 11, 7), date(2025, 11, 7), True)
+    assert stats['peak_system_power_kw'] == 88.4
+    assert inverters['peak_kw'].tolist() == [88.4]
+    assert hourly['max_power_kw'].tolist() == [88.4, 17.8]
+    assert '88.4,' in daily.to_csv(index=False)